@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hugo build time / memory for the two data page outputs of sync_gsheet_models.py:
+
+  markdown    one rawhtml page per product and language, tables translated by regex in
+              layouts/data/single.html (the default);
+  data-files  measurements under data/measurements, front-matter stubs under content/,
+              tables rendered from site.Data (--data-files).
+
+For each mode the site is copied into a scratch directory, the data pages of a synthetic
+sheet (bench_sheets.write_models_sheet) are generated into it and `hugo` builds it --runs
+times. Recorded per mode: generator time, hugo wall time (best run), peak RSS of the hugo
+process and the size of content/, data/ and public/. Results are saved as JSON under
+.tmp/bench/ (compare runs with --compare):
+
+    python scripts/bench_hugo.py --products 5000 --runs 3
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import sync_gsheet_models as models
+from bench_sheets import BENCH_DIR, LANGS, git_commit, print_comparison, write_models_sheet
+from measurements import MeasurementStore
+from sync_io import PROJECT_ROOT, read_csv
+
+# What hugo needs of the site (content/ includes the hand-written pages)
+SITE_PARTS = ("hugo.toml", "archetypes", "content", "data", "i18n", "layouts", "static")
+MODES = ("markdown", "data-files")
+
+
+def dir_mb(path: Path) -> float:
+    return round(sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) / 1e6, 1) if path.exists() else 0.0
+
+
+def copy_site(dst: Path) -> None:
+    dst.mkdir(parents=True)
+    for part in SITE_PARTS:
+        src = PROJECT_ROOT / part
+        if src.is_dir():
+            shutil.copytree(src, dst / part)
+        elif src.exists():
+            shutil.copy2(src, dst / part)
+    # Not the project's measurements: a markdown build removes them (see build()), a data-files
+    # build writes its own, and Hugo would load them in either mode
+    shutil.rmtree(dst / models.MEASUREMENTS_DATA_DIR, ignore_errors=True)
+
+
+def generate(site: Path, store: MeasurementStore, langs: int, data_files: bool) -> float:
+    """Data pages of every product into `site` (relative paths of sync_gsheet_models). Returns seconds."""
+    os.chdir(site)
+    models.RENDER_CACHE = models.RenderCache()
+    t0 = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for lang in LANGS[:langs]:
+            products = store.products_for(lang) or store.products_for("en")
+            models.generate_data_pages(products, lang=lang, data_files=data_files)
+    return time.perf_counter() - t0
+
+
+def run_hugo(hugo: str, site: Path) -> Tuple[float, float]:
+    """One cold build of `site`. Returns (seconds, peak RSS of the hugo process in MB)."""
+    shutil.rmtree(site / "public", ignore_errors=True)
+    shutil.rmtree(site / "resources", ignore_errors=True)
+    log = site / "hugo.log"
+    t0 = time.perf_counter()
+    with log.open("wb") as f:
+        proc = subprocess.Popen([hugo, "--source", str(site), "--destination", str(site / "public")],
+                                stdout=f, stderr=subprocess.STDOUT)
+        # wait4 reports the rusage of this child alone (RUSAGE_CHILDREN would keep the max of all runs)
+        _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - t0
+    code = os.waitstatus_to_exitcode(status)
+    if code != 0:
+        sys.stdout.write(log.read_text(encoding="utf-8", errors="replace")[-4000:])
+        raise SystemExit(f"[!] hugo failed (exit {code}) in {site}")
+    peak = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return seconds, peak
+
+
+def hugo_version(hugo: str) -> str:
+    try:
+        return subprocess.run([hugo, "version"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Benchmark hugo builds of the markdown and data-file data page outputs.")
+    ap.add_argument("--products", type=int, default=5000, help="products per language (default: 5000)")
+    ap.add_argument("--langs", type=int, default=3, choices=range(1, len(LANGS) + 1), help="languages (default: 3)")
+    ap.add_argument("--metrics", type=int, default=30, help="metric rows per product (default: 30)")
+    ap.add_argument("--runs", type=int, default=3, help="hugo builds per mode; the fastest counts (default: 3)")
+    ap.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {', '.join(MODES)}")
+    ap.add_argument("--hugo", default="hugo", help="hugo binary (default: hugo on PATH)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", type=Path, help="results JSON (default: .tmp/bench/hugo-<commit>-<time>.json)")
+    ap.add_argument("--compare", type=Path, help="earlier results JSON to compare against")
+    ap.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    version = hugo_version(args.hugo)
+    if not version:
+        print(f"[!] '{args.hugo}' not found or not working — install Hugo (extended) or pass --hugo PATH.")
+        return 1
+    modes: List[str] = [m for m in args.modes.split(",") if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        print(f"[!] Unknown mode(s): {', '.join(sorted(unknown))}")
+        return 2
+
+    work = BENCH_DIR / "work-hugo"
+    shutil.rmtree(work, ignore_errors=True)
+    work.mkdir(parents=True)
+    sheet = work / "models.csv"
+    rows = write_models_sheet(sheet, args.products, args.langs, args.metrics, args.seed)
+    store = MeasurementStore.from_rows(read_csv(sheet), default_lang="en")
+    print(f"[i] {version}")
+    print(f"[i] Synthetic sheet: {rows} rows, {len(store.products)} pages; {args.runs} hugo run(s) per mode:")
+
+    stages: Dict[str, Dict] = {}
+    try:
+        for mode in modes:
+            site = work / mode
+            copy_site(site)
+            gen_seconds = generate(site, store, args.langs, data_files=mode == "data-files")
+            runs = [run_hugo(args.hugo, site) for _ in range(max(1, args.runs))]
+            stages[f"hugo ({mode})"] = s = {
+                "seconds": round(min(r[0] for r in runs), 3),
+                "peak_rss_mb": round(max(r[1] for r in runs), 1),
+                "runs": [round(r[0], 3) for r in runs],
+                "generate_seconds": round(gen_seconds, 3),
+                "content_mb": dir_mb(site / "content"),
+                "data_mb": dir_mb(site / "data"),
+                "public_mb": dir_mb(site / "public"),
+            }
+            print(f"  {mode:<12} hugo {s['seconds']:>8.2f}s  {s['peak_rss_mb']:>8.1f} MB  "
+                  f"generate {s['generate_seconds']:>6.2f}s  content {s['content_mb']:>7.1f} MB  "
+                  f"data {s['data_mb']:>7.1f} MB  public {s['public_mb']:>7.1f} MB")
+    finally:
+        os.chdir(PROJECT_ROOT)
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "hugo": version,
+            "cpus": os.cpu_count(),
+            "scale": {"products": args.products, "langs": args.langs, "metrics": args.metrics, "seed": args.seed},
+            "rows": rows,
+        },
+        "stages": stages,
+    }
+    out = args.out or BENCH_DIR / f"hugo-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+    print(f"[i] Results: {out}")
+
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text(encoding="utf-8")), result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
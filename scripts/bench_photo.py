@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput / memory benchmark for the photo pipeline (photo.py).
+
+Builds a synthetic RAW tree that mirrors the Drive layout
+(01_RAW_Photos/external-ssd/<brand>/<model>/<capacity>/unit.jpg + 01_kit/*) with JPEG,
+PNG with alpha, WebP and AVIF sources at several resolutions, then measures:
+
+  1. convert_one per input type x resolution: images/s, per-stage time (decode, flatten, lqip,
+     resize, watermark, encode), peak RSS and output bytes;
+  2. encoder trade-offs: WebP method x quality (and AVIF quality) encode time vs. bytes
+     on the MAX_WIDTH output;
+  3. photo.main() end to end (cold, unchanged, then one product changed and pushed with
+     --only) with the rclone remotes pointed at local directories and R2 uploads going
+     through s3_client to a local S3 stand-in (which checks the SigV4 signatures).
+     --link-mbps throttles the stand-ins to a simulated link, to see download / convert /
+     upload overlap the way it does against Drive and R2.
+
+Results are saved as JSON under .tmp/bench/ (compare runs with --compare):
+
+    python scripts/bench_photo.py --sizes 1600x1200,4000x3000 --products 2
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote
+
+from PIL import Image, ImageDraw, features
+
+import photo
+import s3_client
+from bench_sheets import BENCH_DIR, git_commit, print_comparison
+from sync_io import PROJECT_ROOT, peak_rss_mb, reset_peak_rss
+
+STAGES = ("decode", "flatten", "lqip", "resize", "watermark", "encode")
+LINK_MBPS = 0.0  # simulated link speed for the rclone / S3 stand-ins (0 = unthrottled)
+S3_KEY_ID, S3_SECRET = "bench", "bench-secret"
+
+
+# -------------------------
+# Synthetic RAW tree
+# -------------------------
+
+def input_types() -> dict[str, tuple[str, str, dict]]:
+    """name -> (extension, Pillow format, save params); AVIF only when this Pillow can write it."""
+    types = {
+        "jpeg": (".jpg", "JPEG", {"quality": 92}),
+        "png-alpha": (".png", "PNG", {}),
+        "webp": (".webp", "WEBP", {"quality": 90}),
+    }
+    if features.check("avif"):
+        types["avif"] = (".avif", "AVIF", {"quality": 80})
+    return types
+
+
+def synthetic_photo(w: int, h: int) -> Image.Image:
+    """Product-shot-like test image: smooth gradients, sensor noise and hard edges."""
+    gradient = Image.linear_gradient("L").resize((w, h))
+    radial = Image.radial_gradient("L").resize((w, h))
+    noise = Image.effect_noise((w, h), 24)
+    img = Image.merge("RGB", (gradient, Image.blend(radial, noise, 0.35), Image.blend(gradient, noise, 0.2)))
+    draw = ImageDraw.Draw(img)
+    draw.rounded_rectangle((w * 0.2, h * 0.25, w * 0.8, h * 0.75), radius=w // 20, fill=(40, 44, 52))
+    draw.text((w * 0.25, h * 0.45), "SSD 1TB", fill=(230, 230, 230), font_size=max(12, w // 16))
+    return img
+
+
+def with_cutout_alpha(img: Image.Image) -> Image.Image:
+    """Copy with an elliptical alpha mask (object on a transparent background)."""
+    out = img.copy()
+    mask = Image.new("L", img.size, 0)
+    ImageDraw.Draw(mask).ellipse((img.width * 0.1, img.height * 0.1, img.width * 0.9, img.height * 0.9), fill=255)
+    out.putalpha(mask)
+    return out
+
+
+def build_raw_tree(raw_root: Path, sizes: list[tuple[int, int]], products: int) -> list[tuple[str, str, Path]]:
+    """
+    <raw_root>/external-ssd/bench-brand/model-<i>/1tb/unit.jpg plus 01_kit/<type>-<w>x<h>.<ext>.
+    Returns [(input type, "WxH", path)] for every kit image.
+    """
+    kits = []
+    for i in range(products):
+        product = raw_root / "external-ssd" / "bench-brand" / f"model-{i}" / "1tb"
+        (product / photo.KIT_SUBDIR).mkdir(parents=True, exist_ok=True)
+        kits.append(product / photo.KIT_SUBDIR)
+
+    images: list[tuple[str, str, Path]] = []
+    for w, h in sizes:  # one source image in memory at a time
+        rgb = synthetic_photo(w, h)
+        rgba = with_cutout_alpha(rgb)
+        if (w, h) == sizes[-1]:
+            for kit in kits:
+                rgb.save(kit.parent / photo.RAW_NAME, "JPEG", quality=92)
+        for name, (ext, fmt, params) in input_types().items():
+            for kit in kits:
+                path = kit / f"{name}-{w}x{h}{ext}"
+                (rgba if name == "png-alpha" else rgb).save(path, fmt, **params)
+                images.append((name, f"{w}x{h}", path))
+        del rgb, rgba
+    images.sort(key=lambda t: t[2])
+    return images
+
+
+# -------------------------
+# 1) convert_one per input type / resolution
+# -------------------------
+
+def bench_convert(images: list[tuple[str, str, Path]], out_root: Path) -> dict[str, dict]:
+    groups: dict[str, list[dict]] = {}
+    for kind, size, src in images:
+        dst = out_root / src.parent.name / (src.stem + ".webp")
+        timings: dict[str, float] = {}
+        reset_peak_rss()
+        t0 = time.perf_counter()
+        variants = photo.convert_one(src, dst, timings, {})
+        seconds = time.perf_counter() - t0
+        groups.setdefault(f"convert {kind} {size}", []).append({
+            "seconds": seconds,
+            "peak_rss_mb": peak_rss_mb() or 0.0,
+            "stages": timings,
+            "in_bytes": src.stat().st_size,
+            "out_bytes": sum((dst.parent / v["file"]).stat().st_size for v in variants),
+            "canonical_bytes": dst.stat().st_size,
+            "variants": len(variants),
+        })
+
+    results: dict[str, dict] = {}
+    print(f"  {'input':<26} {'img/s':>6} {'ms/img':>8}  " + " ".join(f"{s:>9}" for s in STAGES) +
+          f" {'peak MB':>8} {'in KB':>8} {'out KB':>8}")
+    for name, runs in groups.items():
+        n = len(runs)
+        mean = sum(r["seconds"] for r in runs) / n
+        stages = {s: sum(r["stages"].get(s, 0.0) for r in runs) / n for s in STAGES}
+        res = results[name] = {
+            "seconds": round(mean, 4),
+            "images_per_s": round(1 / mean, 2) if mean else None,
+            "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+            "stages_ms": {s: round(v * 1000, 1) for s, v in stages.items()},
+            "in_bytes": sum(r["in_bytes"] for r in runs) // n,
+            "out_bytes": sum(r["out_bytes"] for r in runs) // n,
+            "canonical_bytes": sum(r["canonical_bytes"] for r in runs) // n,
+            "variants": runs[0]["variants"],
+            "images": n,
+        }
+        print(f"  {name[len('convert '):]:<26} {res['images_per_s']:>6} {mean * 1000:>8.0f}  " +
+              " ".join(f"{res['stages_ms'][s]:>9.0f}" for s in STAGES) +
+              f" {res['peak_rss_mb']:>8.0f} {res['in_bytes'] / 1024:>8.0f} {res['out_bytes'] / 1024:>8.0f}")
+    return results
+
+
+# -------------------------
+# 2) Encoder trade-offs on the MAX_WIDTH output
+# -------------------------
+
+def canonical_output(src: Path) -> Image.Image:
+    """What convert_one encodes as <stem>.webp: reduced decode, RGB, MAX_WIDTH resize, watermark."""
+    with Image.open(src) as src_img:
+        w, h = src_img.size
+        target = min(w, photo.MAX_WIDTH)
+        img = photo._open_reduced(src_img, target)
+        img = photo._flatten(img) if img.mode == "RGBA" else img.convert("RGB")
+    if img.width != target:
+        img = img.resize((target, int(h * target / w)), Image.LANCZOS)
+    return photo.add_watermark(img)
+
+
+def bench_encoders(sources: list[tuple[str, Path]], methods: list[int], qualities: list[int],
+                   avif_qualities: list[int], repeat: int) -> list[dict]:
+    settings: list[tuple[str, dict]] = [("WEBP", {"method": m, "quality": q}) for m in methods for q in qualities]
+    if features.check("avif"):
+        settings += [("AVIF", {"quality": q}) for q in avif_qualities]
+
+    rows: list[dict] = []
+    print(f"  {'source':<12} {'format':<6} {'method':>6} {'q':>4} {'ms':>8} {'KB':>8}")
+    for kind, src in sources:
+        img = canonical_output(src)
+        for fmt, params in settings:
+            best = float("inf")
+            size = 0
+            for _ in range(repeat):
+                buf = io.BytesIO()
+                t0 = time.perf_counter()
+                img.save(buf, fmt, **params)
+                best = min(best, time.perf_counter() - t0)
+                size = buf.tell()
+            current = fmt == "WEBP" and params == {"method": photo.WEBP_METHOD, "quality": photo.WEBP_Q}
+            rows.append({"source": kind, "format": fmt.lower(), **params, "ms": round(best * 1000, 1),
+                         "bytes": size, "current": current})
+            print(f"  {kind:<12} {fmt.lower():<6} {params.get('method', '-'):>6} {params['quality']:>4} "
+                  f"{best * 1000:>8.1f} {size / 1024:>8.1f}{'  <- current' if current else ''}")
+    return rows
+
+
+# -------------------------
+# 3) photo.main() end to end, rclone remotes as local directories
+# -------------------------
+
+def _throttle(nbytes: int) -> None:
+    if LINK_MBPS > 0:
+        time.sleep(nbytes * 8 / (LINK_MBPS * 1e6))
+
+
+def _mirror(src: Path, dst: Path):
+    """Make dst a copy of src (changed files copied, extra files removed); yields each copied path."""
+    dst.mkdir(parents=True, exist_ok=True)
+    wanted = set()
+    for f in sorted(src.rglob("*")):
+        if not f.is_file():
+            continue
+        rel = f.relative_to(src)
+        wanted.add(rel)
+        target = dst / rel
+        if not target.exists() or target.read_bytes() != f.read_bytes():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _throttle(f.stat().st_size)
+            shutil.copy2(f, target)
+            yield rel.as_posix()
+    for f in dst.rglob("*"):
+        if f.is_file() and f.relative_to(dst) not in wanted:
+            f.unlink()
+
+
+def local_rclone(cmd: list[str], stage: str | None = None) -> None:
+    """
+    Stand-in for photo.run(["rclone", "sync" | "copy" | "delete", ...]) when all sides are local paths:
+    real rclone if installed, otherwise sync = mirror copy (changed files copied, extra files removed),
+    copy / delete = the files listed in --files-from-raw. Filters (--include) are ignored.
+    """
+    if shutil.which("rclone"):
+        subprocess.check_call(cmd)
+        return
+    listed = []
+    if "--files-from-raw" in cmd:
+        listed = Path(cmd[cmd.index("--files-from-raw") + 1]).read_text(encoding="utf-8").splitlines()
+    if cmd[1] == "copy":
+        for rel in listed:
+            target = Path(cmd[3]) / rel
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _throttle((Path(cmd[2]) / rel).stat().st_size)
+            shutil.copy2(Path(cmd[2]) / rel, target)
+        return
+    if cmd[1] == "delete":
+        for rel in listed:
+            (Path(cmd[2]) / rel).unlink(missing_ok=True)
+        return
+    for _ in _mirror(Path(cmd[2]), Path(cmd[3])):
+        pass
+
+
+_rclone_events = photo.rclone_events
+
+
+def local_rclone_events(cmd: list[str]):
+    """Stand-in for photo.rclone_events(["rclone", "sync", SRC, DST, ...]): a "Copied" record per mirrored file."""
+    if shutil.which("rclone"):
+        yield from _rclone_events(cmd)
+        return
+    for rel in _mirror(Path(cmd[2]), Path(cmd[3])):
+        yield {"level": "info", "msg": "Copied (new)", "object": rel}
+
+
+class _S3Handler(BaseHTTPRequestHandler):
+    """PUT / DELETE object under the server's root (path-style /<bucket>/<key>), SigV4 checked with s3_client."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:  # keep the benchmark output readable
+        pass
+
+    def _reply(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self, body: bytes) -> bool:
+        payload = self.headers.get("x-amz-content-sha256", "")
+        amz_date = datetime.strptime(self.headers.get("x-amz-date", ""), "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+        expected = s3_client.sign_v4(self.command, f"http://{self.headers['Host']}{self.path}", payload,
+                                     S3_KEY_ID, S3_SECRET, now=amz_date)
+        return payload == hashlib.sha256(body).hexdigest() and self.headers.get("Authorization") == expected["Authorization"]
+
+    def _target(self) -> Path:
+        return Path(self.server.root) / unquote(self.path.lstrip("/"))
+
+    def do_PUT(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self._authorized(body):
+            return self._reply(403, b"SignatureDoesNotMatch")
+        _throttle(len(body))
+        target = self._target()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(body)
+        self._reply(200)
+
+    def do_DELETE(self) -> None:
+        if not self._authorized(b""):
+            return self._reply(403, b"SignatureDoesNotMatch")
+        self._target().unlink(missing_ok=True)
+        self._reply(204)
+
+
+def serve_s3(root: Path) -> ThreadingHTTPServer:
+    """Local S3 stand-in on 127.0.0.1 (random port): bucket <name> is the directory root/<name>."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _S3Handler)
+    server.root = str(root)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_main(work: Path, jobs: int, images: int) -> dict[str, dict]:
+    photo.RAW_ROOT = str(work / "drive" / "01_RAW_Photos")
+    photo.PROC_ROOT = str(work / "drive" / "02_Processed_WebP")
+    photo.R2_ROOT = str(work / "r2")
+    photo.run = local_rclone
+    photo.rclone_events = local_rclone_events
+    s3 = serve_s3(work)  # R2 uploads land in work/r2, like the rclone stand-in's
+    os.environ.update({"R2_ENDPOINT": f"http://127.0.0.1:{s3.server_port}", "R2_BUCKET": "r2",
+                       "R2_ACCESS_KEY_ID": S3_KEY_ID, "R2_SECRET_ACCESS_KEY": S3_SECRET})
+    os.chdir(work)  # .tmp/raw, .tmp/processed, data/*.json are relative to the cwd
+
+    product = "external-ssd/bench-brand/model-0/1tb"
+    runs = (("photo main (cold)", [], images), ("photo main (unchanged)", [], images),
+            ("photo main (--only 1 changed)", ["--only", product], 1))
+    results: dict[str, dict] = {}
+    for name, extra, count in runs:
+        if extra:
+            synthetic_photo(1600, 1200).save(Path(photo.RAW_ROOT) / product / photo.RAW_NAME, "JPEG", quality=90)
+        sys.argv = ["photo.py", "--jobs", str(jobs), *extra]
+        reset_peak_rss()
+        t0 = time.perf_counter()
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                photo.main()
+            except SystemExit as e:
+                if e.code:
+                    raise
+            finally:
+                sys.stdout = stdout
+        seconds = time.perf_counter() - t0
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "images_per_s": round(count / seconds, 2),
+            "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+            "worker_peak_rss_mb": round(children, 1),
+            "jobs": jobs,
+        }
+        r = results[name]
+        print(f"  {name:<30} {r['seconds']:>8.2f}s  {r['images_per_s']:>7.2f} img/s  "
+              f"main {r['peak_rss_mb']:.0f} MB, workers {r['worker_peak_rss_mb']:.0f} MB (jobs={jobs})")
+    s3.shutdown()
+    return results
+
+
+def parse_size(s: str) -> tuple[int, int]:
+    w, h = s.lower().split("x")
+    return int(w), int(h)
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Benchmark photo.py conversion throughput, memory and encoder settings.")
+    ap.add_argument("--sizes", default="1600x1200,4000x3000,6000x4000",
+                    help="source resolutions, ascending (default: 1600x1200,4000x3000,6000x4000)")
+    ap.add_argument("--products", type=int, default=2, help="products in the synthetic RAW tree (default: 2)")
+    ap.add_argument("--methods", default="0,4,6", help="WebP methods to sweep (default: 0,4,6)")
+    ap.add_argument("--qualities", default="75,85,90", help="WebP qualities to sweep (default: 75,85,90)")
+    ap.add_argument("--avif-qualities", default="50,60,70", help="AVIF qualities to sweep (default: 50,60,70)")
+    ap.add_argument("--repeat", type=int, default=3, help="encodes per setting, fastest counts (default: 3)")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="workers for photo.main()")
+    ap.add_argument("--skip-main", action="store_true", help="skip the end-to-end photo.main() run")
+    ap.add_argument("--link-mbps", type=float, default=0.0,
+                    help="throttle the end-to-end run's Drive / R2 stand-ins to this link speed (default: off)")
+    ap.add_argument("--out", type=Path, help="results JSON (default: .tmp/bench/photo-<commit>-<time>.json)")
+    ap.add_argument("--compare", type=Path, help="earlier results JSON to compare against")
+    ap.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return ap.parse_args()
+
+
+def main() -> int:
+    global LINK_MBPS
+    args = parse_args()
+    LINK_MBPS = args.link_mbps
+    sizes = sorted((parse_size(s) for s in args.sizes.split(",")), key=lambda wh: wh[0] * wh[1])
+    work = BENCH_DIR / "work-photo"
+    shutil.rmtree(work, ignore_errors=True)
+    raw_root = work / "drive" / "01_RAW_Photos"
+
+    t0 = time.perf_counter()
+    images = build_raw_tree(raw_root, sizes, args.products)
+    print(f"[i] Synthetic RAW tree: {len(images) + args.products} images "
+          f"({', '.join(input_types())} at {args.sizes}) in {time.perf_counter() - t0:.1f}s")
+
+    try:
+        print("[i] convert_one (serial, per image):")
+        stages = bench_convert(images, work / "convert")
+
+        print("[i] Encoder settings (MAX_WIDTH output):")
+        largest = f"{sizes[-1][0]}x{sizes[-1][1]}"
+        sources = [(kind, path) for kind, size, path in images if size == largest and "model-0" in path.parts]
+        sweep = bench_encoders(sources, [int(m) for m in args.methods.split(",")],
+                               [int(q) for q in args.qualities.split(",")],
+                               [int(q) for q in args.avif_qualities.split(",")], max(1, args.repeat))
+
+        if not args.skip_main:
+            print("[i] photo.main() end to end (rclone remotes as local directories):")
+            stages.update(bench_main(work, args.jobs, len(images) + args.products))
+    finally:
+        os.chdir(PROJECT_ROOT)
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "cpus": os.cpu_count(),
+            "scale": {"sizes": args.sizes, "products": args.products, "types": list(input_types())},
+            "settings": {"max_width": photo.MAX_WIDTH, "webp_q": photo.WEBP_Q, "webp_method": photo.WEBP_METHOD,
+                         "widths": list(photo.RESPONSIVE_WIDTHS), "avif": photo.AVIF_ENABLED},
+        },
+        "stages": stages,
+        "encode_sweep": sweep,
+    }
+    out = args.out or BENCH_DIR / f"photo-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+    print(f"[i] Results: {out}")
+
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text(encoding="utf-8")), result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the sheet -> content generators (sync_gsheet_models.py, sync_gsheet_reviews.py).
+
+Generates synthetic models/reviews sheets at a configurable scale, serves them from a local
+HTTP stand-in for the published Google Sheets, and runs every generator stage in a scratch
+directory, recording wall time, peak RSS and file writes per stage. Results are saved as JSON
+under .tmp/bench/ so runs on two commits can be compared:
+
+    python scripts/bench_sheets.py --products 10000 --langs 3 --metrics 30
+    python scripts/bench_sheets.py --compare .tmp/bench/sheets-<commit>-<time>.json
+"""
+
+import argparse
+import csv
+import functools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import sync_io
+from measurements import SHEET_COLUMNS, MeasurementStore
+from sync_io import WRITE_STATS, fetch_sheet, peak_rss_mb, read_csv, reset_peak_rss
+
+import sync_gsheet_models as models
+import sync_gsheet_reviews as reviews
+
+BENCH_DIR = sync_io.PROJECT_ROOT / ".tmp" / "bench"
+LANGS = ("en", "de", "fr")
+CAPACITIES = (("500GB", "500gb", 465.7), ("1TB", "1tb", 931.3), ("2TB", "2tb", 1862.6), ("4TB", "4tb", 3725.3))
+
+MODELS_HEADER = list(SHEET_COLUMNS)
+REVIEWS_HEADER = ["lang", "published", "category", "brand_slug", "model_slug", "capacity_slug", "title", "description", "text"]
+
+# The metrics the calculator reads come first; the rest are filler sections of 6 metrics each.
+CALC_METRICS = (
+    ("fresh_seq_write_250gib", "slc_speed_mb_s", 300, 1050),
+    ("fresh_seq_write_250gib", "slc_data_gib", 10, 400),
+    ("fresh_seq_write_250gib", "sustained_speed_mb_s", 80, 1000),
+    ("seq_read_250gib", "avg_speed_mb_s", 400, 1050),
+)
+
+
+# -------------------------
+# Synthetic sheets
+# -------------------------
+
+def _product(i: int):
+    brand = f"Brand {i % 40:02d}"
+    model = f"Model {i // 40:04d}"
+    cap_label, cap_slug, cap_gib = CAPACITIES[i % len(CAPACITIES)]
+    return brand, model, cap_label, brand.lower().replace(" ", "-"), model.lower().replace(" ", "-"), cap_slug, cap_gib
+
+
+def write_models_sheet(path: Path, products: int, langs: int, metrics: int, seed: int) -> int:
+    """products x langs x metrics rows in the published sheet's column layout. Returns the row count."""
+    rng = random.Random(seed)
+    metric_defs = list(CALC_METRICS[:metrics])
+    for j in range(len(metric_defs), metrics):
+        metric_defs.append((f"section_{j // 6:02d}", f"metric_{j:03d}_mb_s", 1, 2000))
+
+    rows = 0
+    with path.open("w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(MODELS_HEADER)
+        for i in range(products):
+            brand, model, cap_label, brand_slug, model_slug, cap_slug, cap_gib = _product(i)
+            values = [round(rng.uniform(lo, hi), 1) for _, _, lo, hi in metric_defs]
+            for lang in LANGS[:langs]:
+                for k, (section_key, metric_key, _, _) in enumerate(metric_defs):
+                    v = values[k]
+                    # DE rows use decimal commas like the real sheet
+                    median = str(v).replace(".", ",") if lang == "de" else str(v)
+                    meta = [f"SN{i:06d}", "FW1.0", "Windows 11", "3.41"] if k == 0 else ["", "", "", ""]
+                    w.writerow([
+                        lang, "TRUE", "external-ssd", "External SSD" if k == 0 else "", brand, model, cap_label,
+                        brand_slug, model_slug, cap_slug, cap_gib if k == 0 else "", *meta,
+                        section_key, section_key.replace("_", " ").title(), metric_key,
+                        median, median, median, median,
+                    ])
+                    rows += 1
+    return rows
+
+
+def change_models_sheet(path: Path) -> None:
+    """Re-test of the first product: new values in its first metric row (all languages). mtime moves on for the 304 check."""
+    with path.open(encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    col = {name: i for i, name in enumerate(rows[0])}
+    first = (rows[1][col["brand_slug"]], rows[1][col["model_slug"]], rows[1][col["capacity_slug"]])
+    metric = (rows[1][col["section_key"]], rows[1][col["metric_key"]])
+    for r in rows[1:]:
+        if (r[col["brand_slug"]], r[col["model_slug"]], r[col["capacity_slug"]]) == first and \
+                (r[col["section_key"]], r[col["metric_key"]]) == metric:
+            for c in ("avg_median", "attempt1_value", "attempt2_value", "attempt3_value"):
+                r[col[c]] = "1"
+    with path.open("w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+    st = path.stat()
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+
+
+def write_reviews_sheet(path: Path, products: int, langs: int, review_chars: int, seed: int) -> int:
+    """One long review per product and language (multi-line quoted cells, commas, quotes). Returns the row count."""
+    rng = random.Random(seed)
+    words = ("SLC", "cache", "sustained", "write", "speed", "thermal", "throttling", "USB", "enclosure", "NAND",
+             "controller", "\"quoted\"", "comma,", "MB/s", "GiB")
+    rows = 0
+    with path.open("w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(REVIEWS_HEADER)
+        for i in range(products):
+            brand, model, cap_label, brand_slug, model_slug, cap_slug, _ = _product(i)
+            paragraphs: List[str] = []
+            size = 0
+            while size < review_chars:
+                p = " ".join(rng.choice(words) for _ in range(60))
+                paragraphs.append(p)
+                size += len(p) + 2
+            text = "\n\n".join(paragraphs)
+            for lang in LANGS[:langs]:
+                w.writerow([lang, "TRUE", "external-ssd", brand_slug, model_slug, cap_slug,
+                            f"{brand} {model} {cap_label} review", f"Review of the {brand} {model}", text])
+                rows += 1
+    return rows
+
+
+# -------------------------
+# Local HTTP stand-in for the published sheets
+# -------------------------
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):  # noqa: A002 (stdlib signature)
+        pass
+
+
+def serve_dir(directory: Path) -> ThreadingHTTPServer:
+    """Serve `directory` on 127.0.0.1 (random port); Last-Modified / If-Modified-Since give real 304s."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# -------------------------
+# Stage runner
+# -------------------------
+
+class Bench:
+    """Runs stages with stdout silenced; records seconds, peak RSS and WRITE_STATS deltas per stage."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, Dict] = {}
+
+    def run(self, name: str, fn: Callable[[], Optional[int]]) -> None:
+        written, skipped = WRITE_STATS.written, WRITE_STATS.skipped
+        reset_peak_rss()
+        t0 = time.perf_counter()
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            items = fn()
+        seconds = time.perf_counter() - t0
+        self.stages[name] = {
+            "seconds": round(seconds, 4),
+            "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+            "written": WRITE_STATS.written - written,
+            "skipped": WRITE_STATS.skipped - skipped,
+            "items": items,
+        }
+        s = self.stages[name]
+        print(f"  {name:<28} {s['seconds']:>9.3f}s  {s['peak_rss_mb']:>8.1f} MB  "
+              f"{s['written']:>7} written  {s['skipped']:>7} unchanged")
+
+
+def run_benchmarks(args: argparse.Namespace, work: Path, base_url: str, sheets: Path) -> Dict[str, Dict]:
+    models_url = f"{base_url}/models.csv"
+    reviews_url = f"{base_url}/reviews.csv"
+    models.CSV_URL = models_url
+    reviews.CSV_URL = reviews_url
+    reviews.OUT_ROOT = work / "content"
+    reviews.KIT_MANIFEST_PATH = work / "data" / "kit_images.json"
+    sync_io.SHEET_CACHE_DIR = work / ".tmp" / "gsheet"
+    os.chdir(work)  # the models generator writes content/ and static/ relative to the cwd
+
+    b = Bench()
+    state: Dict = {}
+
+    def fetch():
+        state["models_csv"], _ = fetch_sheet(models_url, models.SHEET_CACHE_NAME)
+        return 1
+
+    def count_rows():
+        return sum(1 for _ in read_csv(state["models_csv"]))
+
+    def build_store():
+        state["store"] = MeasurementStore.from_rows(
+            (r for r in read_csv(state["models_csv"]) if models.truthy(r.get("published", ""))), default_lang="en")
+        return len(state["store"].products)
+
+    def calculator_json():
+        products = state["store"].products_for("en")
+        shards = models.build_calculator_json(products)
+        models.write_calculator_json(shards)
+        return len(products)
+
+    def render_md():
+        products = state["store"].products_for("en")
+        for p in products:
+            models.build_md(p)
+        return len(products)
+
+    def data_pages():
+        models.RENDER_CACHE = models.RenderCache()
+        n = 0
+        for lang in LANGS:
+            products = state["store"].products_for(lang) or state["store"].products_for("en")
+            models.generate_data_pages(products, lang=lang)
+            n += len(products)
+        return n
+
+    def models_main(*flags: str):
+        sys.argv = ["sync_gsheet_models.py", *flags]
+        models.RENDER_CACHE = models.RenderCache()
+        models.main()
+        return len(state["store"].products)
+
+    def review_md():
+        kit = reviews.load_kit_manifest()
+        n = 0
+        for r in read_csv(state["reviews_csv"]):
+            reviews.build_review_md(r, kit)
+            n += 1
+        return n
+
+    def reviews_main():
+        sys.argv = ["sync_gsheet_reviews.py"]
+        reviews.main()
+        return None
+
+    print(f"[i] Stages ({args.products} products x {args.langs} langs x {args.metrics} metrics):")
+    b.run("fetch_sheet (cold)", fetch)
+    b.run("fetch_sheet (304)", fetch)
+    b.run("read_csv", count_rows)
+    b.run("MeasurementStore", build_store)
+    b.run("build_calculator_json", calculator_json)
+    b.run("build_md (en)", render_md)
+    b.run("generate_data_pages (cold)", data_pages)
+    b.run("generate_data_pages (warm)", data_pages)
+
+    # End to end: fresh output tree and sheet cache, then an immediate no-op rerun
+    shutil.rmtree(work / "content", ignore_errors=True)
+    shutil.rmtree(work / ".tmp", ignore_errors=True)
+    b.run("models main (cold)", models_main)
+    b.run("models main (unchanged)", models_main)
+    change_models_sheet(sheets / "models.csv")
+    b.run("models main (1 changed)", models_main)
+    b.run("models main (--from-db)", lambda: models_main("--from-db"))
+
+    state["reviews_csv"], _ = fetch_sheet(reviews_url, reviews.SHEET_CACHE_NAME)
+    b.run("build_review_md", review_md)
+    b.run("reviews main (cold)", reviews_main)
+    b.run("reviews main (unchanged)", reviews_main)
+    return b.stages
+
+
+# -------------------------
+# Results
+# -------------------------
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=sync_io.PROJECT_ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=sync_io.PROJECT_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return out + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_comparison(old: Dict, new: Dict) -> None:
+    print(f"\n[i] {old['meta']['commit']} -> {new['meta']['commit']}")
+    if old["meta"].get("scale") != new["meta"].get("scale"):
+        print(f"[!] Different scale: {old['meta'].get('scale')} vs {new['meta'].get('scale')}")
+    print(f"  {'stage':<28} {'old s':>9} {'new s':>9} {'delta':>8}  {'old MB':>8} {'new MB':>8}")
+    for name, s in new["stages"].items():
+        o = old["stages"].get(name)
+        if not o:
+            print(f"  {name:<28} {'—':>9} {s['seconds']:>9.3f}")
+            continue
+        delta = (s["seconds"] - o["seconds"]) / o["seconds"] * 100 if o["seconds"] else 0.0
+        print(f"  {name:<28} {o['seconds']:>9.3f} {s['seconds']:>9.3f} {delta:>+7.1f}%  "
+              f"{o['peak_rss_mb']:>8.1f} {s['peak_rss_mb']:>8.1f}")
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Benchmark the sheet -> content generators on synthetic sheets.")
+    ap.add_argument("--products", type=int, default=2000, help="products per language (default: 2000)")
+    ap.add_argument("--langs", type=int, default=3, choices=range(1, len(LANGS) + 1), help="languages (default: 3)")
+    ap.add_argument("--metrics", type=int, default=30, help="metric rows per product (default: 30)")
+    ap.add_argument("--review-chars", type=int, default=20000, help="review text length (default: 20000)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", type=Path, help="results JSON (default: .tmp/bench/sheets-<commit>-<time>.json)")
+    ap.add_argument("--compare", type=Path, help="earlier results JSON to compare against")
+    ap.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    return ap.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    work = BENCH_DIR / "work-sheets"
+    shutil.rmtree(work, ignore_errors=True)
+    sheets = work / "sheets"
+    sheets.mkdir(parents=True)
+
+    t0 = time.perf_counter()
+    model_rows = write_models_sheet(sheets / "models.csv", args.products, args.langs, args.metrics, args.seed)
+    review_rows = write_reviews_sheet(sheets / "reviews.csv", args.products, args.langs, args.review_chars, args.seed)
+    print(f"[i] Synthetic sheets: {model_rows} model rows "
+          f"({(sheets / 'models.csv').stat().st_size / 1e6:.1f} MB), {review_rows} reviews "
+          f"({(sheets / 'reviews.csv').stat().st_size / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f}s")
+
+    server = serve_dir(sheets)
+    try:
+        stages = run_benchmarks(args, work, f"http://127.0.0.1:{server.server_address[1]}", sheets)
+    finally:
+        server.shutdown()
+        os.chdir(sync_io.PROJECT_ROOT)
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": models.calc_engine is not None,
+            "scale": {"products": args.products, "langs": args.langs, "metrics": args.metrics,
+                      "review_chars": args.review_chars, "seed": args.seed},
+            "rows": {"models": model_rows, "reviews": review_rows},
+        },
+        "stages": stages,
+    }
+    out = args.out or BENCH_DIR / f"sheets-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2) + "\n", encoding="utf-8")
+    print(f"[i] Results: {out}")
+
+    if args.compare:
+        print_comparison(json.loads(args.compare.read_text(encoding="utf-8")), result)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reference implementation of the read/write time model from layouts/_default/calculator.html
+(calcWriteParts / calcReadSeconds / sortByTime), vectorized with NumPy.
+
+Write time is piecewise linear in the file size s (GiB): the first slc_gib at slc_speed,
+the rest at sustained_speed. Two such curves cross at most a handful of times, so the
+ranking only changes at finitely many sizes. rank_shard() finds those sizes exactly and
+encodes the ranking as an initial order plus the blocks that change at each breakpoint;
+the calculator then walks the breakpoints instead of re-sorting on every input change.
+
+Requires numpy (optional for sync_gsheet_models.py: without it no ranking is emitted
+and the client sorts as before).
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+MiB_PER_GiB = 1024
+PAIR_BLOCK = 256  # rows of the pairwise crossing matrix evaluated at once
+TIE_RTOL = 1e-9  # times this close at a breakpoint count as tied
+RANK_MAX_GIB = 8192.0  # breakpoints are emitted up to this size; the client sorts beyond it
+RANK_MAX_BREAKS = 20000  # more ranking changes than this: emit nothing, the client sorts
+
+
+def _col(shard: Dict, name: str) -> np.ndarray:
+    """Numeric column as float64; null/0 -> 0 (same as toNum in the calculator)."""
+    return np.array([v or 0 for v in shard["cols"].get(name, [])], dtype=np.float64)
+
+
+class WriteCurves:
+    """t(s) = s*u for s <= a, a*u + (s-a)*w beyond; u, w in seconds per GiB. Models without both speeds never finish."""
+
+    def __init__(self, slc_gib: np.ndarray, slc_speed: np.ndarray, sustained_speed: np.ndarray) -> None:
+        self.valid = (slc_speed > 0) & (sustained_speed > 0)
+        # Invalid rows get harmless zeros here and are masked to inf in times()
+        self.u = np.where(self.valid, MiB_PER_GiB / np.where(self.valid, slc_speed, 1), 0.0)
+        self.w = np.where(self.valid, MiB_PER_GiB / np.where(self.valid, sustained_speed, 1), 0.0)
+        self.a = np.where(self.valid, np.maximum(slc_gib, 0), 0.0)
+
+    def times(self, sizes: np.ndarray) -> np.ndarray:
+        """Seconds for every model (rows) at every size (columns) in one batch."""
+        s = np.asarray(sizes, dtype=np.float64)[None, :]
+        a, u, w = self.a[:, None], self.u[:, None], self.w[:, None]
+        slc = np.minimum(s, a)
+        t = slc * u + (s - slc) * w
+        return np.where(self.valid[:, None], t, np.inf)
+
+    def crossings(self, limit: float, max_roots: Optional[int] = None) -> Optional[np.ndarray]:
+        """
+        Sizes 0 < s <= limit where two valid curves intersect or split (sorted, unique).
+        None as soon as more than max_roots distinct sizes have a strict crossing: the ranking
+        changes at each of them, so the caller would drop it anyway and the pairwise pass stops early.
+        """
+        idx = np.flatnonzero(self.valid)
+        a, u, w = self.a[idx], self.u[idx], self.w[idx]
+        out: List[np.ndarray] = []
+        found, inner = np.empty(0), []
+        for start in range(0, len(idx), PAIR_BLOCK):
+            i = np.arange(start, min(start + PAIR_BLOCK, len(idx)))[:, None]
+            j = np.arange(len(idx))[None, :]
+            upper = j > i
+            ai, aj = a[i], a[j]
+            k1, k2 = np.minimum(ai, aj), np.maximum(ai, aj)
+            # Segments [0, k1], [k1, k2], [k2, inf): the difference of two curves is linear on each.
+            for lo, hi in ((np.zeros_like(k1), k1), (k1, k2), (k2, np.full_like(k2, np.inf))):
+                si = np.where(lo < ai, u[i], w[i])
+                sj = np.where(lo < aj, u[j], w[j])
+                slope = si - sj
+                d_lo = _t(lo, ai, u[i], w[i]) - _t(lo, aj, u[j], w[j])
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    root = lo - d_lo / slope
+                hit = upper & (slope != 0) & (root > lo) & (root <= np.minimum(hi, limit))
+                out.append(root[hit])
+                if max_roots is not None:
+                    # A root at a segment end may only touch; one inside always swaps the pair.
+                    inner.append(root[hit & (root < hi)])
+            if max_roots is not None:
+                found = np.unique(np.concatenate([found] + inner))
+                inner = []
+                if found.size > max_roots:
+                    return None
+        # Curves tied up to a kink split there without crossing: kinks are candidates too.
+        out.append(a[(a > 0) & (a <= limit)])
+        return np.unique(np.concatenate(out))
+
+
+class ReadCurves:
+    """t(s) = s * 1024 / seq_speed: lines through the origin never cross, the ranking is fixed."""
+
+    def __init__(self, read_speed: np.ndarray) -> None:
+        self.valid = read_speed > 0
+        self.u = np.where(self.valid, MiB_PER_GiB / np.where(self.valid, read_speed, 1), 0.0)
+
+    def times(self, sizes: np.ndarray) -> np.ndarray:
+        s = np.asarray(sizes, dtype=np.float64)[None, :]
+        return np.where(self.valid[:, None], s * self.u[:, None], np.inf)
+
+    def crossings(self, limit: float, max_roots: Optional[int] = None) -> Optional[np.ndarray]:
+        return np.empty(0)
+
+
+def _t(s: np.ndarray, a: np.ndarray, u: np.ndarray, w: np.ndarray) -> np.ndarray:
+    slc = np.minimum(s, a)
+    return slc * u + (s - slc) * w
+
+
+def order_at(curves, size: float) -> np.ndarray:
+    """Ranking at one size, as the calculator's stable sort gives it: by time, then row index; never-finishing last."""
+    t = curves.times(np.array([size]))[:, 0]
+    return np.lexsort((np.arange(t.size), t))
+
+
+def ranking(curves, limit: float = RANK_MAX_GIB, max_breaks: int = RANK_MAX_BREAKS) -> Optional[Dict]:
+    """
+    {"order": ranking just above 0 GiB, "breaks": [[size, pos, [row, ...]], ...], "upTo": limit}:
+    for sizes above `size`, positions pos.. of the ranking hold the listed rows (valid up to `upTo`).
+    Rows whose curves cross at a breakpoint sit next to each other, so each change is a small block.
+    None if the ranking changes more than max_breaks times (the client sorts instead); crossings()
+    stops once it has found that many, so large shards cost no more than the limit.
+    """
+    breaks = curves.crossings(limit, max_roots=max_breaks)
+    if breaks is None:
+        return None
+    probes = _probes(breaks)
+    order = order_at(curves, probes[0])
+    out = {"order": order.tolist(), "breaks": [], "upTo": limit}
+    if not breaks.size:
+        return out
+
+    pos = np.empty_like(order)
+    pos[order] = np.arange(order.size)
+    for k, b in enumerate(breaks):
+        if k % PAIR_BLOCK == 0:
+            # Times at the next PAIR_BLOCK breakpoints and at the probes just past them, one batch each
+            at_breaks = curves.times(breaks[k:k + PAIR_BLOCK])
+            at_probes = curves.times(probes[k + 1:k + 1 + PAIR_BLOCK])
+        after = at_probes[:, k % PAIR_BLOCK]
+        moved = _tied_rows(order, at_breaks[:, k % PAIR_BLOCK])
+        for lo, hi in _runs(np.sort(pos[moved])):
+            block = order[lo:hi + 1]
+            new_block = block[np.lexsort((block, after[block]))]
+            if np.array_equal(new_block, block):
+                continue
+            order[lo:hi + 1] = new_block
+            pos[new_block] = np.arange(lo, hi + 1)
+            out["breaks"].append([float(b), int(lo), new_block.tolist()])
+            if len(out["breaks"]) > max_breaks:
+                return None
+    return out
+
+
+def _probes(breaks: np.ndarray) -> np.ndarray:
+    """One size strictly inside each interval between breakpoints (first: just above 0, last: past the last break)."""
+    edges = np.concatenate(([0.0], breaks, [breaks[-1] * 2 + 1 if breaks.size else 1.0]))
+    return (edges[:-1] + edges[1:]) / 2
+
+
+def _tied_rows(order: np.ndarray, at_b: np.ndarray) -> np.ndarray:
+    """Rows tied with a ranking neighbour at the breakpoint (whole tie groups when 3+ curves meet)."""
+    t_at = at_b[order]
+    tol = TIE_RTOL * np.maximum(np.abs(t_at[1:]), 1.0)
+    with np.errstate(invalid="ignore"):  # inf - inf for never-finishing rows
+        tied = np.isfinite(t_at[1:]) & (np.abs(t_at[1:] - t_at[:-1]) <= tol)
+    rows = np.zeros(order.size, dtype=bool)
+    rows[:-1] |= tied
+    rows[1:] |= tied
+    return order[rows]
+
+
+def _runs(positions: np.ndarray):
+    """Contiguous [lo, hi] runs of sorted positions."""
+    if not positions.size:
+        return
+    start = prev = int(positions[0])
+    for p in positions[1:]:
+        p = int(p)
+        if p != prev + 1:
+            yield start, prev
+            start = p
+        prev = p
+    yield start, prev
+
+
+def curves_for(shard: Dict, mode: str):
+    if mode == "write":
+        return WriteCurves(_col(shard, "slc_gib"), _col(shard, "slc_speed"), _col(shard, "sustained_speed"))
+    return ReadCurves(_col(shard, "read_speed"))
+
+
+def rank_shard(shard: Dict) -> Dict[str, Dict]:
+    """
+    Ranking (initial order + breakpoints) per calculator mode, for the "rank" field of a calculator shard.
+    Modes with more than RANK_MAX_BREAKS changes are left out (the client sorts for those).
+    """
+    out = {}
+    for mode in ("write", "read"):
+        r = ranking(curves_for(shard, mode))
+        if r is not None:
+            out[mode] = r
+    return out
+
+
+def replay(rank: Dict, size: float) -> List[int]:
+    """What the calculator does with a "rank" entry: apply every break below `size` to the initial order."""
+    order = list(rank["order"])
+    for b, lo, block in rank["breaks"]:
+        if b >= size:
+            break
+        order[lo:lo + len(block)] = block
+    return order
+
+
+def check_ranking(shard: Dict, sizes: Optional[Sequence[float]] = None) -> int:
+    """
+    Regression check of the emitted ranking: replay it at each size (default: a dense grid up to
+    RANK_MAX_GIB) and compare with the batch-evaluated times. Returns the number of (mode, size)
+    points where the replayed order is not sorted by time (ties in either order are fine).
+    """
+    grid = np.asarray(sizes if sizes is not None else np.linspace(0.5, RANK_MAX_GIB, 4000), dtype=np.float64)
+    bad = 0
+    for mode, rank in rank_shard(shard).items():
+        times = curves_for(shard, mode).times(grid)
+        for c, s in enumerate(grid):
+            if s > rank["upTo"]:
+                continue
+            t = times[:, c][replay(rank, float(s))]
+            n = int(np.isfinite(t).sum())
+            if not np.isfinite(t[:n]).all() or np.any(np.diff(t[:n]) < -TIE_RTOL * np.maximum(t[1:n], 1.0)):
+                bad += 1
+    return bad
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Derive the models-sheet metrics from raw fio results instead of typing them in.
+
+    python scripts/ingest_fio.py CAMPAIGN_DIR [--out PATH] [--lang en] [--no-curves] [--profile] [--metrics-json PATH]
+
+A campaign is one folder per product and test, three attempts each (see content/en/methodology):
+
+    CAMPAIGN_DIR/<category>/<brand_slug>/<model_slug>/<capacity_slug>/
+        product.json                      brand, model, capacity_label, capacity_gib, serial_number,
+                                          firmware, operating_system, category_title (all optional)
+        fresh_seq_write_250gib/attempt1/  *_bw*.log (--write_bw_log) and/or fio --output-format=json
+        fresh_seq_write_250gib/attempt2/
+        ...
+
+Bandwidth logs are read in chunks of LOG_CHUNK_BYTES into NumPy arrays and folded into
+BIN_MS throughput bins as they stream, so memory is bounded by the run time in bins, not
+by the number of log lines (a 250 GiB write logged per I/O is ~256k lines per attempt).
+On the fresh write the SLC-cache cliff is found on the binned curve (see find_cliff).
+
+The binned curves of the sequential tests are also reduced to CURVE_POINTS points per
+attempt with LTTB (largest triangle three buckets, which keeps peaks, dips and the cliff)
+and written as content/<lang>/data/<product>/throughput.json, a resource of the data page
+bundle that layouts/data/single.html draws as an inline SVG (--no-curves skips this). Only
+languages that already have the product's data page get the file.
+
+The output is a CSV in the sheet's own column layout (measurements.SHEET_COLUMNS), with
+avg_median = median of the three attempts, ready to paste into the models sheet or to feed
+MeasurementStore directly. Requires numpy.
+"""
+
+import argparse
+import csv
+import io
+import json
+import statistics
+import sys
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from measurements import SHEET_COLUMNS
+from sync_gsheet_models import OUT_ROOT, TARGET_LANGS
+from sync_io import METRICS, argv_value, atomic_write_text, run_main
+
+OUT_PATH = Path(".tmp/fio_rows.csv")
+LOG_CHUNK_BYTES = 8 << 20  # bandwidth log text parsed per NumPy chunk
+BIN_MS = 1000  # throughput curve resolution (matches --log_avg_msec=1000)
+ATTEMPTS = 3
+
+MB = 1000 * 1000  # fio "MB/s" as published: decimal megabytes
+GiB = 1 << 30
+
+# SLC-cache cliff detection on the binned write curve
+CLIFF_SMOOTH_BINS = 5  # rolling median width, irons out single-interval dips
+CLIFF_HOLD_BINS = 10  # the speed must stay below the threshold this long to count as the cliff
+CLIFF_MIN_DROP = 0.2  # post-cache level at least this much below the cached level, else no cliff
+
+# Throughput curves published with the data pages
+CURVES_NAME = "throughput.json"  # page bundle resource, read by layouts/data/single.html
+CURVES_VERSION = 1
+CURVE_POINTS = 80  # per attempt; 3 attempts x 2 tests keep the inline SVGs of a page at ~4 KB
+CURVE_SECTIONS = ("fresh_seq_write_250gib", "seq_read_250gib")
+
+
+# -------------------------
+# Bandwidth logs
+# -------------------------
+
+class BandwidthCurve:
+    """Bytes transferred per BIN_MS bin of one fio run, built from a streamed bandwidth log."""
+
+    def __init__(self, bins: np.ndarray, bin_ms: int = BIN_MS, seconds: Optional[float] = None) -> None:
+        self.bins = bins  # float64 bytes per bin
+        self.bin_ms = bin_ms
+        self.seconds = seconds if seconds is not None else len(bins) * bin_ms / 1000  # run time
+
+    @property
+    def total_bytes(self) -> float:
+        return float(self.bins.sum())
+
+    def mb_s(self) -> np.ndarray:
+        """Throughput per bin in MB/s."""
+        return self.bins / MB / (self.bin_ms / 1000)
+
+
+def _log_chunks(path: Path) -> Iterator[np.ndarray]:
+    """(time_ms, bw_KiB/s) rows of a fio bandwidth log, LOG_CHUNK_BYTES of text at a time."""
+    with path.open("r", encoding="ascii", errors="replace") as f:
+        while True:
+            lines = f.readlines(LOG_CHUNK_BYTES)
+            if not lines:
+                return
+            data = np.loadtxt(lines, delimiter=",", usecols=(0, 1), dtype=np.float64, ndmin=2)
+            if len(data):
+                yield data
+
+
+def read_bw_log(path: Path, bin_ms: int = BIN_MS) -> BandwidthCurve:
+    """
+    Stream a fio bandwidth log (time in ms, bandwidth in KiB/s; averaged or per I/O, relative or
+    --log_unix_epoch times) into a BandwidthCurve. Each entry covers the time since the previous
+    one, so bytes = bandwidth x that gap; the bytes go to the bin the entry ends in.
+    """
+    bins = np.zeros(1024, dtype=np.float64)
+    used = 0
+    start: Optional[float] = None
+    prev_t: Optional[float] = None
+    samples = 0
+    for chunk in _log_chunks(path):
+        t, bw = chunk[:, 0], chunk[:, 1]
+        samples += len(t)
+        if start is None:
+            # Relative logs start at the job start; epoch logs only give us the first interval's length
+            first_gap = t[0] if t[0] < 1e12 else (float(np.median(np.diff(t))) if len(t) > 1 else float(bin_ms))
+            start = t[0] - first_gap
+            prev_t = start
+        gaps = np.diff(t, prepend=prev_t)
+        prev_t = t[-1]
+        nbytes = bw * 1024 * np.clip(gaps, 0, None) / 1000
+        idx = np.maximum(((t - start - 1) // bin_ms).astype(np.int64), 0)
+        need = int(idx[-1]) + 1
+        if need > len(bins):
+            bins = np.resize(bins, max(need, 2 * len(bins)))
+            bins[used:] = 0
+        used = max(used, need)
+        np.add.at(bins, idx, nbytes)
+    METRICS.count("fio_log_samples", samples)
+    seconds = (prev_t - start) / 1000 if start is not None else 0.0
+    return BandwidthCurve(bins[:used].copy(), bin_ms, seconds)
+
+
+def _rolling_median(x: np.ndarray, width: int) -> np.ndarray:
+    if len(x) < width:
+        return x.copy()
+    pad = width // 2
+    padded = np.pad(x, (pad, width - 1 - pad), mode="edge")
+    return np.median(np.lib.stride_tricks.sliding_window_view(padded, width), axis=1)
+
+
+def find_cliff(curve: BandwidthCurve) -> Optional[int]:
+    """
+    Bin where the SLC cache runs out, or None when the write never drops (no cache, or a
+    cache bigger than the run). The cached level is the median of the first 5% of the run,
+    the post-cache level the median of the second half; the cliff is the first bin from which
+    the smoothed curve stays below their midpoint for CLIFF_HOLD_BINS.
+    """
+    speed = _rolling_median(curve.mb_s(), CLIFF_SMOOTH_BINS)
+    n = len(speed)
+    if n < 2 * CLIFF_HOLD_BINS:
+        return None
+    cached = float(np.median(speed[:max(CLIFF_SMOOTH_BINS, n // 20)]))
+    after = float(np.median(speed[n // 2:]))
+    if after >= cached * (1 - CLIFF_MIN_DROP):
+        return None
+    below = (speed < (cached + after) / 2).astype(np.int64)
+    held = np.flatnonzero(np.convolve(below, np.ones(CLIFF_HOLD_BINS, dtype=np.int64), mode="valid") == CLIFF_HOLD_BINS)
+    return int(held[0]) if len(held) else None
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Indices of n points that keep the visual shape of (x, y) (Largest Triangle Three Buckets,
+    Steinarsson 2013): first and last point, then per bucket the point spanning the largest
+    triangle with the previously kept point and the mean of the next bucket.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    every = (size - 2) / (n - 2)
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, size)
+        mx, my = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - mx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (my - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def curve_points(curve: BandwidthCurve, n: int = CURVE_POINTS) -> Dict[str, List[int]]:
+    """{"t": seconds, "v": MB/s} of the LTTB-reduced curve (time = end of each bin)."""
+    t = np.arange(1, len(curve.bins) + 1) * (curve.bin_ms / 1000)
+    v = curve.mb_s()
+    keep = lttb(t, v, n)
+    return {"t": np.rint(t[keep]).astype(int).tolist(), "v": np.rint(v[keep]).astype(int).tolist()}
+
+
+# -------------------------
+# fio JSON output
+# -------------------------
+
+def read_fio_json(path: Path) -> Optional[Dict]:
+    """fio --output-format=json result, or None. Leading warning lines (e.g. "fio: ...") are skipped."""
+    text = path.read_text(encoding="utf-8", errors="replace")
+    start = text.find("{")
+    if start < 0:
+        return None
+    try:
+        data = json.loads(text[start:])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and "jobs" in data else None
+
+
+def _job_side(result: Dict) -> Dict:
+    """The read or write stats of the (single) job, whichever moved data."""
+    job = result["jobs"][0]
+    return max((job.get("read", {}), job.get("write", {})), key=lambda s: s.get("io_bytes", 0))
+
+
+# -------------------------
+# Metrics per test
+# -------------------------
+
+class Attempt:
+    """One fio run: its bandwidth curve and/or JSON result."""
+
+    def __init__(self, curve: Optional[BandwidthCurve], result: Optional[Dict]) -> None:
+        self.curve = curve
+        self.result = result
+
+    def totals(self) -> Optional[Tuple[float, float]]:
+        """(bytes, seconds) of the whole run, from the log or else from the JSON result."""
+        if self.curve is not None and len(self.curve.bins):
+            return self.curve.total_bytes, self.curve.seconds
+        if self.result is not None:
+            side = _job_side(self.result)
+            if side.get("runtime"):
+                return float(side["io_bytes"]), side["runtime"] / 1000
+        return None
+
+
+def write_metrics(a: Attempt) -> Dict[str, Optional[float]]:
+    totals = a.totals()
+    if totals is None:
+        return {}
+    nbytes, seconds = totals
+    out: Dict[str, Optional[float]] = {"avg_speed_mb_s": nbytes / MB / seconds, "time_total_sec": seconds}
+    cliff = find_cliff(a.curve) if a.curve is not None else None
+    if cliff is None:
+        # No cache visible: the whole run is the sustained speed, SLC columns stay empty
+        out["sustained_speed_mb_s"] = out["avg_speed_mb_s"]
+        return out
+    slc_bytes = float(a.curve.bins[:cliff].sum())
+    slc_seconds = cliff * a.curve.bin_ms / 1000
+    out.update({
+        "slc_speed_mb_s": slc_bytes / MB / slc_seconds,
+        "time_slc_sec": slc_seconds,
+        "slc_data_gib": slc_bytes / GiB,
+        "sustained_speed_mb_s": (nbytes - slc_bytes) / MB / (seconds - slc_seconds),
+    })
+    return out
+
+
+def read_metrics(a: Attempt) -> Dict[str, Optional[float]]:
+    totals = a.totals()
+    if totals is None:
+        return {}
+    nbytes, seconds = totals
+    return {"avg_speed_mb_s": nbytes / MB / seconds, "data_size_gib": nbytes / GiB}
+
+
+def random_read_metrics(a: Attempt) -> Dict[str, Optional[float]]:
+    out = read_metrics(a)
+    out.pop("data_size_gib", None)
+    if a.result is not None:
+        pct = _job_side(a.result).get("clat_ns", {}).get("percentile", {})
+        if "99.000000" in pct:
+            out["latency_p99_ms"] = pct["99.000000"] / 1e6
+    return out
+
+
+# section_key -> (section title, metric keys in published order with decimals, metrics of one attempt)
+SECTIONS: Dict[str, Tuple[str, List[Tuple[str, int]], Callable[[Attempt], Dict[str, Optional[float]]]]] = {
+    "fresh_seq_write_250gib": ("Sequential Write (250GiB)", [
+        ("avg_speed_mb_s", 0), ("sustained_speed_mb_s", 0), ("slc_speed_mb_s", 0),
+        ("time_slc_sec", 0), ("slc_data_gib", 0), ("time_total_sec", 0),
+    ], write_metrics),
+    "seq_read_250gib": ("Sequential Read (250GiB)", [("avg_speed_mb_s", 0), ("data_size_gib", 0)], read_metrics),
+    "random_read_4k_qd1": ("Random Read 4K QD1", [("avg_speed_mb_s", 0), ("latency_p99_ms", 1)], random_read_metrics),
+}
+
+
+def _fmt(v: Optional[float], decimals: int) -> str:
+    if v is None:
+        return ""
+    return str(int(round(v))) if decimals == 0 else f"{v:.{decimals}f}"
+
+
+def load_attempt(attempt_dir: Path) -> Attempt:
+    logs = sorted(attempt_dir.glob("*_bw*.log"))
+    curve = read_bw_log(logs[0]) if logs else None
+    result = None
+    for p in sorted(attempt_dir.glob("*.json")):
+        result = read_fio_json(p)
+        if result is not None:
+            break
+    return Attempt(curve, result)
+
+
+def section_rows(section_dir: Path, curves: Optional[List[Optional[Dict]]] = None) -> Tuple[List[Dict[str, str]], Optional[str]]:
+    """
+    Sheet rows (metric columns only) of one test, plus the fio version if a JSON result has it.
+    With a curves list, the reduced curve of every attempt (None where there is no log) is appended to it.
+    """
+    title, metrics, derive = SECTIONS[section_dir.name]
+    per_attempt: List[Dict[str, Optional[float]]] = []
+    fio_version = None
+    for n in range(1, ATTEMPTS + 1):
+        d = section_dir / f"attempt{n}"
+        if not d.is_dir():
+            per_attempt.append({})
+            if curves is not None:
+                curves.append(None)
+            continue
+        with METRICS.stage("read logs"):
+            a = load_attempt(d)
+        METRICS.count("fio_attempts")
+        if a.result is not None and not fio_version:
+            fio_version = str(a.result.get("fio version", "")).replace("fio-", "") or None
+        with METRICS.stage("metrics"):
+            per_attempt.append(derive(a))
+        if curves is not None:
+            with METRICS.stage("curves"):
+                curves.append(_attempt_curve(section_dir.name, a.curve))
+
+    rows: List[Dict[str, str]] = []
+    for metric_key, decimals in metrics:
+        values = [m.get(metric_key) for m in per_attempt]
+        measured = [v for v in values if v is not None]
+        if not measured:
+            continue
+        rows.append({
+            "section_key": section_dir.name,
+            "section_title": title,
+            "metric_key": metric_key,
+            "avg_median": _fmt(statistics.median(measured), decimals),
+            "attempt1_value": _fmt(values[0], decimals),
+            "attempt2_value": _fmt(values[1], decimals),
+            "attempt3_value": _fmt(values[2], decimals),
+        })
+    return rows, fio_version
+
+
+def _attempt_curve(section_key: str, curve: Optional[BandwidthCurve]) -> Optional[Dict]:
+    if curve is None or not len(curve.bins):
+        return None
+    out: Dict = curve_points(curve)
+    if section_key == "fresh_seq_write_250gib":
+        cliff = find_cliff(curve)
+        out["cliff"] = round(cliff * curve.bin_ms / 1000) if cliff is not None else None
+    return out
+
+
+def pack_curves(curves: Dict[str, List[Optional[Dict]]]) -> Dict:
+    """
+    Curves asset of one product (format CURVES_VERSION):
+      {"v": 1, "tests": {section_key: {"t_max": s, "v_max": MB/s,
+                                       "attempts": [{"t": [...], "v": [...], ("cliff": s | null)} | null, ...]}}}
+    t_max / v_max are shared by the attempts of a test, so they are drawn on one scale.
+    """
+    tests: Dict[str, Dict] = {}
+    for key, attempts in curves.items():
+        drawn = [a for a in attempts if a]
+        if not drawn:
+            continue
+        tests[key] = {
+            "t_max": max(a["t"][-1] for a in drawn),
+            "v_max": max(max(a["v"]) for a in drawn),
+            "attempts": attempts,
+        }
+    return {"v": CURVES_VERSION, "tests": tests}
+
+
+def write_curves(product_path: str, asset: Dict) -> None:
+    """The asset goes next to index.md of the product's data page, in each language that has one."""
+    text = json.dumps(asset, ensure_ascii=False, separators=(",", ":")) + "\n"
+    page_dirs = [OUT_ROOT / lang / "data" / product_path for lang in TARGET_LANGS]
+    page_dirs = [d for d in page_dirs if (d / "index.md").exists()]
+    if not page_dirs:
+        print(f"[i] No data page for {product_path} yet — curves skipped (rerun after the sheet sync).")
+    for d in page_dirs:
+        out_file = d / CURVES_NAME
+        if atomic_write_text(out_file, text):
+            print(f"Curves: {out_file} ({len(text)} bytes)")
+
+
+def product_dirs(campaign: Path) -> Iterator[Path]:
+    """<category>/<brand>/<model>/<capacity> folders that contain at least one known test."""
+    for d in sorted(p for p in campaign.glob("*/*/*/*") if p.is_dir()):
+        if any((d / s).is_dir() for s in SECTIONS):
+            yield d
+
+
+def product_rows(campaign: Path, product_dir: Path, lang: str,
+                 curves: Optional[Dict[str, List[Optional[Dict]]]] = None) -> List[Dict[str, str]]:
+    category, brand_slug, model_slug, capacity_slug = product_dir.relative_to(campaign).parts
+    meta: Dict[str, str] = {}
+    meta_path = product_dir / "product.json"
+    if meta_path.exists():
+        meta = {k: str(v) for k, v in json.loads(meta_path.read_text(encoding="utf-8")).items()}
+
+    rows: List[Dict[str, str]] = []
+    fio_version = meta.get("fio_version", "")
+    for section_key in SECTIONS:
+        section_dir = product_dir / section_key
+        if section_dir.is_dir():
+            attempt_curves = curves.setdefault(section_key, []) if curves is not None and section_key in CURVE_SECTIONS else None
+            section, version = section_rows(section_dir, attempt_curves)
+            rows.extend(section)
+            fio_version = fio_version or version or ""
+
+    base = {
+        "lang": lang, "published": "TRUE", "category": category, "brand_slug": brand_slug,
+        "model_slug": model_slug, "capacity_slug": capacity_slug, "fio_version": fio_version,
+    }
+    for key in ("category_title", "brand", "model", "capacity_label", "capacity_gib", "serial_number",
+                "firmware", "operating_system"):
+        base[key] = meta.get(key, "")
+    return [{**base, **r} for r in rows]
+
+
+def ingest(campaign: Path, lang: str = "en",
+           on_curves: Optional[Callable[[str, Dict], None]] = None) -> Iterator[Dict[str, str]]:
+    """Sheet rows of every product; with on_curves, also (product path, pack_curves asset) per product."""
+    for d in product_dirs(campaign):
+        METRICS.count("products")
+        curves: Optional[Dict[str, List[Optional[Dict]]]] = {} if on_curves else None
+        yield from product_rows(campaign, d, lang, curves)
+        asset = pack_curves(curves) if curves else None
+        if asset and asset["tests"]:
+            on_curves(d.relative_to(campaign).as_posix(), asset)
+
+
+def to_csv(rows: Iterator[Dict[str, str]]) -> str:
+    buf = io.StringIO()
+    w = csv.DictWriter(buf, fieldnames=SHEET_COLUMNS, restval="", lineterminator="\n")
+    w.writeheader()
+    for r in rows:
+        w.writerow(r)
+    return buf.getvalue()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="fio logs -> models sheet rows")
+    ap.add_argument("campaign", type=Path, help="campaign folder: <category>/<brand>/<model>/<capacity>/<test>/attemptN")
+    ap.add_argument("--out", type=Path, default=OUT_PATH, help=f"CSV to write, - for stdout (default: {OUT_PATH})")
+    ap.add_argument("--lang", default="en", help="value of the lang column (default: en)")
+    ap.add_argument("--no-curves", action="store_true", help=f"do not write {CURVES_NAME} next to the data pages")
+    ap.add_argument("--profile", action="store_true", help="print stage timings and counters at the end")
+    ap.add_argument("--metrics-json", metavar="PATH", help="write stage timings and counters as JSON")
+    return ap.parse_args(argv)
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.campaign.is_dir():
+        print(f"[!] Not a folder: {args.campaign}")
+        return 1
+    to_stdout = str(args.out) == "-"
+    # With --out - stdout carries the CSV: the status lines of ingest() go to stderr
+    with redirect_stdout(sys.stderr if to_stdout else sys.stdout):
+        text = to_csv(ingest(args.campaign, args.lang, None if args.no_curves else write_curves))
+    if to_stdout:
+        sys.stdout.write(text)
+    elif atomic_write_text(args.out, text):
+        print(f"Sheet rows: {args.out} ({text.count(chr(10)) - 1} rows)")
+    else:
+        print(f"[i] {args.out} unchanged")
+    return 0
+
+
+if __name__ == "__main__":
+    # The --profile report follows the CSV on stdout with --out -: send it to stderr then
+    raise SystemExit(run_main("ingest_fio", main, sys.stderr if argv_value("--out") == "-" else None))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-memory measurement store for the models sheet.
+
+Sheet rows are parsed and validated once into compact __slots__ records with interned
+slugs/keys, indexed by product and by (section_key, metric_key). Every generator
+(data pages, calculator JSON) queries the store instead of re-scanning raw row dicts.
+"""
+
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (lang, category, brand_slug, model_slug, capacity_slug)
+ProductKey = Tuple[str, str, str, str, str]
+# (section_key, metric_key)
+MetricKey = Tuple[str, str]
+
+# Column layout of the published models sheet: one row per product, language and metric
+SHEET_COLUMNS = (
+    "lang", "published", "category", "category_title", "brand", "model", "capacity_label",
+    "brand_slug", "model_slug", "capacity_slug", "capacity_gib", "serial_number", "firmware",
+    "operating_system", "fio_version", "section_key", "section_title", "metric_key",
+    "avg_median", "attempt1_value", "attempt2_value", "attempt3_value",
+)
+
+
+def fnum(x: str) -> Optional[float]:
+    x = (x or "").strip()
+    if not x:
+        return None
+    try:
+        return float(x)
+    except Exception:
+        try:
+            return float(x.replace(",", "."))
+        except Exception:
+            return None
+
+
+def _get(row: Dict[str, str], key: str) -> str:
+    return (row.get(key) or "").strip()
+
+
+class Measurement:
+    """One sheet row's metric: section/metric keys, median and the three attempts (as published strings)."""
+
+    __slots__ = ("section_key", "section_title", "metric_key", "avg_median", "value", "attempts")
+
+    def __init__(self, row: Dict[str, str]) -> None:
+        self.section_key = sys.intern(_get(row, "section_key"))
+        self.section_title = sys.intern(_get(row, "section_title"))
+        self.metric_key = sys.intern(_get(row, "metric_key"))
+        self.avg_median = _get(row, "avg_median")
+        self.value = fnum(self.avg_median)  # avg_median parsed once
+        self.attempts = (_get(row, "attempt1_value"), _get(row, "attempt2_value"), _get(row, "attempt3_value"))
+
+
+class Product:
+    """One data page: a (lang, category, brand, model, capacity) with its meta (first row wins) and measurements."""
+
+    __slots__ = (
+        "key", "lang", "category", "brand_slug", "model_slug", "capacity_slug",
+        "brand", "model", "capacity_label", "capacity_gib", "serial_number", "firmware",
+        "operating_system", "fio_version", "category_title",
+        "measurements", "metrics", "_content_key",
+    )
+
+    def __init__(self, key: ProductKey, row: Dict[str, str]) -> None:
+        self.key = key
+        self.lang, self.category, self.brand_slug, self.model_slug, self.capacity_slug = key
+        self.brand = _get(row, "brand")
+        self.model = _get(row, "model")
+        self.capacity_label = _get(row, "capacity_label")
+        self.capacity_gib = _get(row, "capacity_gib")
+        self.serial_number = _get(row, "serial_number")
+        self.firmware = _get(row, "firmware")
+        self.operating_system = _get(row, "operating_system")
+        self.fio_version = _get(row, "fio_version")
+        # Prefer explicit category title from sheet if provided
+        self.category_title = (row.get("category_title") or row.get("category_name") or "").strip()
+        self.measurements: List[Measurement] = []  # sheet order
+        self.metrics: Dict[MetricKey, Measurement] = {}  # first row per (section_key, metric_key)
+        self._content_key: Optional[tuple] = None
+
+    @property
+    def path_key(self) -> str:
+        """category/brand/model/capacity (same as photo.py / calculator ids)."""
+        return f"{self.category}/{self.brand_slug}/{self.model_slug}/{self.capacity_slug}"
+
+    def content_key(self) -> tuple:
+        """
+        Everything a data page renders from, without the language: equal keys mean equal page bodies
+        (e.g. the EN product reused for DE/FR fallback, or identical rows across languages).
+        """
+        if self._content_key is None:
+            self._content_key = (
+                self.category, self.brand_slug, self.model_slug, self.capacity_slug,
+                self.brand, self.model, self.capacity_label, self.capacity_gib, self.serial_number,
+                self.firmware, self.operating_system, self.fio_version,
+                tuple((m.section_key, m.section_title, m.metric_key, m.avg_median, m.attempts) for m in self.measurements),
+            )
+        return self._content_key
+
+    def metric(self, section_key: str, metric_key: str) -> Optional[Measurement]:
+        return self.metrics.get((section_key, metric_key))
+
+    def value(self, section_key: str, metric_key: str) -> Optional[float]:
+        m = self.metrics.get((section_key, metric_key))
+        return m.value if m else None
+
+
+class MeasurementStore:
+    """Products in sheet order, indexed by product key, language and (section_key, metric_key)."""
+
+    __slots__ = ("products", "by_lang", "by_metric", "skipped_rows")
+
+    def __init__(self) -> None:
+        self.products: Dict[ProductKey, Product] = {}
+        self.by_lang: Dict[str, List[Product]] = {}
+        self.by_metric: Dict[MetricKey, List[Tuple[Product, Measurement]]] = {}
+        self.skipped_rows = 0  # rows without the four slugs
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, str]], default_lang: str = "en") -> "MeasurementStore":
+        store = cls()
+        for r in rows:
+            store.add_row(r, default_lang)
+        return store
+
+    def add_row(self, row: Dict[str, str], default_lang: str = "en") -> None:
+        lang = _get(row, "lang").lower() or default_lang
+        key = tuple(sys.intern(v) for v in (
+            lang, _get(row, "category"), _get(row, "brand_slug"), _get(row, "model_slug"), _get(row, "capacity_slug"),
+        ))
+        if not all(key[1:]):
+            self.skipped_rows += 1
+            return
+
+        p = self.products.get(key)
+        if p is None:
+            p = self.products[key] = Product(key, row)
+            self.by_lang.setdefault(key[0], []).append(p)
+
+        m = Measurement(row)
+        if not m.section_key:
+            return
+        p.measurements.append(m)
+        mk = (m.section_key, m.metric_key)
+        if mk not in p.metrics:
+            p.metrics[mk] = m
+            self.by_metric.setdefault(mk, []).append((p, m))
+
+    def langs(self) -> List[str]:
+        return list(self.by_lang.keys())
+
+    def products_for(self, lang: str) -> List[Product]:
+        return self.by_lang.get(lang, [])
+
+    def all_products(self) -> List[Product]:
+        return list(self.products.values())
@@ -14,14 +14,40 @@
 # 01_RAW_Photos/external-ssd/<brand>/<model>/<capacity>/unit.jpg
 # 01_RAW_Photos/external-ssd/<brand>/<model>/<capacity>/<any_subfolder>/*.{jpg,jpeg,avif,webp,png}
 # All subfolders are mirrored automatically into 02_Processed_WebP and R2.
-
+#
+# Download, conversion and upload are one pipeline: a file starts converting as soon as
+# rclone has pulled it, and every finished WebP is queued for upload right away (R2 through
+# the in-process S3 client when R2_* credentials are set, see s3_client.py; otherwise, and
+# for Drive, rclone batches). Queues between the stages are bounded.
+#
+# Pushes are change lists: only the files this run converted or removed (plus those of
+# earlier runs whose push failed) go to Drive and R2, both at once. A full `rclone sync`
+# of the tree still runs every FULL_SYNC_INTERVAL or with --full-sync.
+# --only external-ssd/<brand>/<model>/<capacity> limits pull, convert and push to one product.
+
+import argparse
+import base64
+import hashlib
+import io
 import json
+import multiprocessing
+import os
+import queue
 import subprocess
 import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 
 from PIL import Image, ImageDraw, ImageFont
 
+import s3_client
+from sync_io import METRICS, atomic_write_text, bind_chain, peak_rss_mb, reset_peak_rss, run_main
+
 # ====== CONFIG ======
 GDRIVE_ROOT = "gdrive:eugen-standard"
 
@@ -33,9 +59,40 @@ R2_ROOT = f"r2:{R2_BUCKET}"
 
 LOCAL_RAW = Path(".tmp/raw")
 LOCAL_PROC = Path(".tmp/processed")
+# Conversion manifest: RAW rel path -> source hash, settings fingerprint, output hash
+CONVERT_MANIFEST = Path(".tmp/photo_manifest.json")
+PUSH_STATE = Path(".tmp/photo_push.json")  # files not yet pushed per remote, time of the last full sync
+PUSH_LIST_DIR = Path(".tmp/push")  # --files-from-raw lists handed to rclone
+
+RCLONE_TRANSFERS = 8  # parallel transfers per destination (rclone --transfers)
+NO_TRAVERSE_MAX = 1000  # up to this many files, look each one up instead of listing the remote
+FULL_SYNC_INTERVAL = 7 * 24 * 3600  # seconds between full reconciles of the remotes
+
+PIPELINE_INFLIGHT = 2  # conversions queued per worker before the download side waits
+UPLOAD_QUEUE = 256  # converted files waiting per push remote before conversions wait
+UPLOAD_BATCH = 200  # at most this many files per streamed `rclone copy`
+CONTENT_TYPES = {".webp": "image/webp", ".avif": "image/avif"}
 
 MAX_WIDTH = 1100        # px
 WEBP_Q = 85            # 1..100
+WEBP_METHOD = 6        # 0 (fast) .. 6 (smallest)
+# Responsive ladder: <stem>-<w>w.webp for every width up to the source width.
+# The MAX_WIDTH output keeps the plain <stem>.webp name (existing URLs stay valid).
+RESPONSIVE_WIDTHS = (320, 640, 1100, 2000)  # px
+AVIF_ENABLED = False   # also write <stem>-<w>w.avif (needs Pillow with AVIF support)
+AVIF_Q = 60            # 1..100
+# Large sources are decoded/reduced to >= REDUCING_GAP x the widest output before LANCZOS
+REDUCING_GAP = 2.0
+
+# multiprocessing start method for the conversion pool (None = platform default).
+# sync_all.py sets "forkserver": forking a process that runs other threads can deadlock.
+POOL_START_METHOD: str | None = None
+# Variants, size, hash and placeholder per processed image, read by Hugo templates
+IMAGES_DATA = Path("data/images.json")
+KIT_MANIFEST = Path("data/kit_images.json")  # product path -> 01_kit photo names, for review pages
+# Placeholder shown until the image loads: a LQIP_WIDTH px wide WebP inlined as a data URI
+LQIP_WIDTH = 16        # px
+LQIP_Q = 40            # 1..100
 
 RAW_NAME = "unit.jpg"   # what you upload to Drive RAW
 OUT_NAME = "unit.webp"  # what we generate and publish
@@ -47,10 +104,106 @@ WATERMARK_COLOR = (107, 114, 128, 140)  # rgba
 # ====================
 
 
-def run(cmd: list[str]) -> None:
-    """Run a command and fail fast with a readable output."""
+def settings_fingerprint() -> str:
+    """Everything that changes output pixels/bytes; a change reconverts affected images automatically."""
+    settings = {
+        "max_width": MAX_WIDTH,
+        "webp_q": WEBP_Q,
+        "webp_method": WEBP_METHOD,
+        "watermark": WATERMARK,
+        "watermark_color": list(WATERMARK_COLOR),
+        "widths": list(RESPONSIVE_WIDTHS),
+        "avif": AVIF_Q if AVIF_ENABLED else None,
+        "reducing_gap": REDUCING_GAP,
+        "lqip": [LQIP_WIDTH, LQIP_Q],
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_convert_manifest() -> dict[str, dict]:
+    """Load .tmp/photo_manifest.json. Returns {} if missing or unreadable (everything reconverts)."""
+    try:
+        return json.loads(CONVERT_MANIFEST.read_text(encoding="utf-8")).get("files", {})
+    except Exception:
+        return {}
+
+
+def save_convert_manifest(files: dict[str, dict]) -> None:
+    data = {"version": 1, "files": dict(sorted(files.items()))}
+    atomic_write_text(CONVERT_MANIFEST, json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+
+
+def needs_convert(entry: dict | None, src_hash: str, fingerprint: str, dst: Path) -> bool:
+    """Reconvert when source bytes, encoder settings or the output on disk differ from the manifest."""
+    if not entry:
+        return True
+    if entry.get("src_sha256") != src_hash or entry.get("settings") != fingerprint:
+        return True
+    if entry.get("dst") != dst.as_posix():
+        return True
+    if any(not (dst.parent / v["file"]).exists() for v in entry.get("variants", [])):
+        return True
+    try:
+        return dst.stat().st_size != entry.get("dst_size")
+    except OSError:
+        return True
+
+
+def run(cmd: list[str], stage: str | None = None) -> None:
+    """Run a command and fail fast with a readable output; timed as `stage` in the run metrics."""
     print("> " + " ".join(cmd))
-    subprocess.check_call(cmd)
+    with METRICS.stage(stage or cmd[0]):
+        subprocess.check_call(cmd)
+
+
+def rclone_events(cmd: list[str]) -> Iterator[dict]:
+    """Run rclone with a JSON log and yield its log records as they happen. Raises if rclone fails."""
+    cmd = cmd + ["--use-json-log", "-v"]
+    print("> " + " ".join(cmd))
+    proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
+    finished = False
+    try:
+        for line in proc.stderr:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                sys.stderr.write(line)  # not a log record (e.g. a panic): pass it through
+        finished = True
+    finally:
+        if not finished:
+            proc.kill()
+        proc.stderr.close()
+        code = proc.wait()
+    if code:
+        raise subprocess.CalledProcessError(code, cmd)
+
+
+def pull_raw(scope: str | None, on_file: Callable[[Path], None]) -> None:
+    """
+    `rclone sync` Drive RAW -> LOCAL_RAW. Each file goes to on_file as soon as rclone reports
+    it copied, so conversion starts while the rest is still downloading.
+    """
+    # NOTE: --checksum avoids relying on timestamps from cloud providers.
+    cmd = ["rclone", "sync", RAW_ROOT, str(LOCAL_RAW), "--checksum"]
+    if scope:
+        # Drive folder names may differ in case from the lowercase processed paths
+        cmd += ["--ignore-case", "--include", f"/{scope}/**"]
+    with METRICS.stage("rclone pull raw"):
+        for event in rclone_events(cmd):
+            msg = event.get("msg", "")
+            if msg.startswith("Copied") and event.get("object"):
+                METRICS.count("raw_downloaded")
+                on_file(LOCAL_RAW / event["object"])
+            elif event.get("level") in ("warning", "error"):
+                print(f"[!] rclone: {event.get('object', '')}: {msg}")
 
 
 def ensure_dirs() -> None:
@@ -58,13 +211,28 @@ def ensure_dirs() -> None:
     LOCAL_PROC.mkdir(parents=True, exist_ok=True)
 
 
+def normalize_scope(only: str | None) -> str | None:
+    """--only value -> processed-tree prefix: 'External-SSD/Samsung/T7/1TB/' -> 'external-ssd/samsung/t7/1tb'."""
+    if not only:
+        return None
+    scope = "/".join(p for p in only.replace("\\", "/").lower().split("/") if p)
+    if not scope or ".." in scope.split("/"):
+        raise SystemExit(f"--only: invalid path {only!r} (expected e.g. external-ssd/<brand>/<model>/<capacity>)")
+    return scope
+
+
+def in_scope(rel_dir: str, scope: str | None) -> bool:
+    return scope is None or rel_dir == scope or rel_dir.startswith(scope + "/")
+
+
 def rel_dir_lower(rel: Path) -> Path:
     """Normalize path to lowercase for consistent output (R2, Drive are case-sensitive)."""
     return Path(*[p.lower() for p in rel.parts])
 
 
-def _get_watermark_font(size: int = 24) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
-    """Load font matching site logo (system-ui, Segoe UI, Roboto, Arial)."""
+@lru_cache(maxsize=None)
+def _watermark_font_path() -> str | None:
+    """First loadable font matching site logo (system-ui, Segoe UI, Roboto, Arial); resolved once per process."""
     paths: list[str] = []
     if sys.platform == "win32":
         # Segoe UI (logo font on Windows), Arial fallback
@@ -81,75 +249,569 @@ def _get_watermark_font(size: int = 24) -> ImageFont.FreeTypeFont | ImageFont.Im
         ]
     for p in paths:
         try:
-            return ImageFont.truetype(p, size)
+            ImageFont.truetype(p, 12)
+            return p
         except OSError:
             continue
-    return ImageFont.load_default()
+    return None
 
 
-def add_watermark(img: Image.Image) -> Image.Image:
-    """Draw gray semi-transparent watermark in bottom-right corner (matches site logo font)."""
-    img_rgba = img.convert("RGBA")
-    overlay = Image.new("RGBA", img_rgba.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(overlay)
-    font = _get_watermark_font(max(14, min(28, img_rgba.width // 40)))
-    bbox = draw.textbbox((0, 0), WATERMARK, font=font)
-    tw, th = bbox[2] - bbox[0], bbox[3] - bbox[1]
-    pad = max(8, img_rgba.width // 80)
-    x = max(0, img_rgba.width - tw - pad)
-    y = max(0, img_rgba.height - th - pad)
-    draw.text((x, y), WATERMARK, fill=WATERMARK_COLOR, font=font)
-    img_rgba = Image.alpha_composite(img_rgba, overlay)
-    return img_rgba.convert("RGB")
-
-
-def convert_one(src: Path, dst: Path) -> None:
-    """Convert src (jpg/avif/webp/png) -> dst (webp), resize down to MAX_WIDTH if needed."""
-    dst.parent.mkdir(parents=True, exist_ok=True)
+@lru_cache(maxsize=None)
+def _get_watermark_font(size: int = 24) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
+    """Load font matching site logo (system-ui, Segoe UI, Roboto, Arial)."""
+    path = _watermark_font_path()
+    if path:
+        return ImageFont.truetype(path, size)
+    return ImageFont.load_default()
 
-    with Image.open(src) as img:
-        # Normalize to RGB
-        if img.mode not in ("RGB", "RGBA"):
-            img = img.convert("RGB")
-        elif img.mode == "RGBA":
-            # Flatten alpha onto white background (safe for product photos)
-            bg = Image.new("RGB", img.size, (255, 255, 255))
-            bg.paste(img, mask=img.split()[-1])
-            img = bg
-        else:
-            img = img.convert("RGB")
 
-        w, h = img.size
-        if w > MAX_WIDTH:
-            new_h = int(h * (MAX_WIDTH / w))
-            img = img.resize((MAX_WIDTH, new_h), Image.LANCZOS)
+@lru_cache(maxsize=64)
+def _watermark_tile(size: int, text: str, color: tuple[int, int, int, int]) -> tuple[Image.Image, tuple[int, int], tuple[int, int]]:
+    """
+    Rendered watermark text on a transparent tile, cached per (font size, text, color).
+    Returns (tile, (text_w, text_h), (ox, oy)) where (ox, oy) is the tile origin relative to the text anchor.
+    """
+    font = _get_watermark_font(size)
+    bbox = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox((0, 0), text, font=font)
+    ox, oy = min(0, bbox[0]), min(0, bbox[1])
+    tile = Image.new("RGBA", (max(1, bbox[2] - ox), max(1, bbox[3] - oy)), (0, 0, 0, 0))
+    ImageDraw.Draw(tile).text((-ox, -oy), text, fill=color, font=font)
+    return tile, (bbox[2] - bbox[0], bbox[3] - bbox[1]), (ox, oy)
 
-        img = add_watermark(img)
-        img.save(dst, "WEBP", quality=WEBP_Q, method=6)
 
+def add_watermark(img: Image.Image) -> Image.Image:
+    """
+    Draw gray semi-transparent watermark in bottom-right corner (matches site logo font).
+
+    Works in place on an RGB image: only the bounding box under the text goes through RGBA
+    compositing (pixel-identical to compositing a full-frame overlay, without the full-size copies).
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    w, h = img.size
+    tile, (tw, th), (ox, oy) = _watermark_tile(max(14, min(28, w // 40)), WATERMARK, WATERMARK_COLOR)
+    pad = max(8, w // 80)
+    x = max(0, w - tw - pad) + ox
+    y = max(0, h - th - pad) + oy
+
+    # Clip the tile to the image
+    left, top = max(0, x), max(0, y)
+    right, bottom = min(w, x + tile.width), min(h, y + tile.height)
+    if right <= left or bottom <= top:
+        return img
+    tile = tile.crop((left - x, top - y, right - x, bottom - y))
+
+    box = (left, top, right, bottom)
+    region = Image.alpha_composite(img.crop(box).convert("RGBA"), tile)
+    img.paste(region.convert("RGB"), box)
+    return img
+
+
+def variant_widths(src_w: int) -> list[int]:
+    """Output widths for a source: the ladder up to the source width (no upscaling) plus the MAX_WIDTH output."""
+    return sorted({w for w in RESPONSIVE_WIDTHS if w <= src_w} | {min(src_w, MAX_WIDTH)})
+
+
+def variant_name(dst: Path, width: int, canonical_w: int, ext: str) -> str:
+    if width == canonical_w and ext == ".webp":
+        return dst.name
+    return f"{dst.stem}-{width}w{ext}"
+
+
+def _save(img: Image.Image, path: Path, fmt: str, **params) -> None:
+    # tmp + rename: a crash mid-encode never leaves a truncated (but newer) file behind
+    tmp = path.with_name(path.name + ".tmp")
+    img.save(tmp, fmt, **params)
+    tmp.replace(path)
+
+
+def _open_reduced(img: Image.Image, target_w: int) -> Image.Image:
+    """
+    Decode at (roughly) the smallest size that still leaves REDUCING_GAP x headroom over target_w:
+    JPEG DCT scaling via draft() before decoding, then integer reduce() for other formats.
+    A 50 MP JPEG headed for 2000px never materializes at full resolution.
+    """
+    w, h = img.size
+    min_w = int(target_w * REDUCING_GAP)
+    if img.format == "JPEG" and min_w < w:
+        img.draft(None, (min_w, max(1, int(h * min_w / w))))
+    img.load()
+    if img.mode == "P":
+        # reduce() does not support palette images
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    factor = img.width // min_w
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """Flatten alpha onto white background (safe for product photos); getchannel avoids split()'s 4 band copies."""
+    bg = Image.new("RGB", img.size, (255, 255, 255))
+    bg.paste(img, mask=img.getchannel("A"))
+    return bg
+
+
+def placeholder(img: Image.Image) -> dict:
+    """Dominant (average) color as #rrggbb and a tiny blurred-up preview as a data: URI, from an RGB image."""
+    small = img.resize((LQIP_WIDTH, max(1, round(img.height * LQIP_WIDTH / img.width))), Image.BOX)
+    r, g, b = small.resize((1, 1), Image.BOX).getpixel((0, 0))
+    buf = io.BytesIO()
+    small.save(buf, "WEBP", quality=LQIP_Q)
+    return {"color": f"#{r:02x}{g:02x}{b:02x}", "lqip": "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")}
+
+
+@contextmanager
+def _stage(timings: dict[str, float] | None, name: str):
+    """Add the wall time of the block to timings[name] (no-op when timings is None)."""
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - t0
+
+
+def convert_one(src: Path, dst: Path, timings: dict[str, float] | None = None,
+                meta: dict | None = None) -> list[dict]:
+    """
+    Convert src (jpg/avif/webp/png) -> dst (webp, resized down to MAX_WIDTH) plus the
+    RESPONSIVE_WIDTHS / AVIF variants next to it, all from a single (reduced) decode.
+    Returns the written variants: [{"file", "w", "h", "format"}], smallest first.
+    With a timings dict, seconds per stage (decode, flatten, lqip, resize, watermark, encode) are added to it;
+    with a meta dict, the placeholder() of the decoded image (color, lqip) is stored in it.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
 
-def main() -> None:
-    force = "--force" in sys.argv
+    with Image.open(src) as src_img:
+        # Output geometry is decided from the original size; decoding may happen smaller.
+        w, h = src_img.size
+        widths = variant_widths(w)
+        canonical_w = min(w, MAX_WIDTH)
+        with _stage(timings, "decode"):
+            img = _open_reduced(src_img, widths[-1])
+
+        # Normalize to RGB (after reduction, so these copies are small)
+        with _stage(timings, "flatten"):
+            if img.mode == "RGBA":
+                img = _flatten(img)
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+        if img is not src_img:
+            src_img.close()  # drop the decoded source buffer now, not after all encodes
+        if meta is not None:
+            # From the already decoded image (before the watermark): no second read of anything
+            with _stage(timings, "lqip"):
+                meta.update(placeholder(img))
+
+        formats = [(".webp", "WEBP", {"quality": WEBP_Q, "method": WEBP_METHOD})]
+        if AVIF_ENABLED:
+            formats.append((".avif", "AVIF", {"quality": AVIF_Q}))
+
+        variants: list[dict] = []
+        for width in widths:
+            out = img
+            if width != img.width:
+                with _stage(timings, "resize"):
+                    out = img.resize((width, int(h * (width / w))), Image.LANCZOS)
+            # Watermark per size so the text scales with the output width. add_watermark works
+            # in place; the unresized image is the widest, so it is always the last one touched.
+            with _stage(timings, "watermark"):
+                out = add_watermark(out)
+            for ext, fmt, params in formats:
+                name = variant_name(dst, width, canonical_w, ext)
+                with _stage(timings, "encode"):
+                    _save(out, dst.parent / name, fmt, **params)
+                variants.append({"file": name, "w": out.width, "h": out.height, "format": fmt.lower()})
+            del out
+        return variants
+
+
+def convert_task(task: tuple[Path, Path], in_worker: bool = True) -> tuple[Path, Path, str | None, dict, dict]:
+    """
+    Pool worker: convert one image, returning the error text instead of raising. The per-image
+    peak RSS is only measured in a pool worker (in_worker); resetting it in-process would clobber
+    the main process's peak that the run report (and concurrent sync_all chains) read.
+    """
+    src, dst = task
+    if in_worker:
+        reset_peak_rss()
+    t0 = time.perf_counter()
+    timings: dict[str, float] = {}
+    try:
+        meta: dict = {}
+        variants = convert_one(src, dst, timings, meta)
+        out = {"dst_sha256": file_sha256(dst), "dst_size": dst.stat().st_size, "variants": variants, **meta}
+    except Exception as e:  # one broken file must not abort the whole batch
+        return src, dst, f"{type(e).__name__}: {e}", {}, {}
+    stats = {"seconds": time.perf_counter() - t0, "peak_rss_mb": peak_rss_mb() if in_worker else None, "stages": timings}
+    return src, dst, None, out, stats
+
+
+class ConvertPool:
+    """
+    Converts images while they are still being discovered: submit() hands a task to the process
+    pool (waiting once PIPELINE_INFLIGHT x jobs are pending) and each finished output goes to
+    on_done right away. close() waits for the rest: ({src: output info}, [(src, error)]).
+    """
+
+    def __init__(self, jobs: int, on_done: Callable[[Path, Path, dict], None] | None = None) -> None:
+        self.on_done = on_done
+        self.done: dict[Path, dict] = {}
+        self.failed: list[tuple[Path, str]] = []
+        self._lock = threading.Lock()
+        self._pool = None
+        if jobs > 1:
+            ctx = multiprocessing.get_context(POOL_START_METHOD) if POOL_START_METHOD else None
+            self._pool = ProcessPoolExecutor(max_workers=jobs, mp_context=ctx)
+        self._slots = threading.BoundedSemaphore(PIPELINE_INFLIGHT * max(jobs, 1))
+
+    def submit(self, src: Path, dst: Path) -> None:
+        if self._pool is None:
+            self._finish(convert_task((src, dst), in_worker=False))
+            return
+        self._slots.acquire()
+        try:
+            fut = self._pool.submit(convert_task, (src, dst))
+        except Exception as e:  # broken pool: fail the task, keep the pipeline going
+            self._slots.release()
+            self._finish((src, dst, f"{type(e).__name__}: {e}", {}, {}))
+            return
+        fut.add_done_callback(bind_chain(lambda f: self._collect(src, dst, f)))
+
+    def _collect(self, src: Path, dst: Path, fut: Future) -> None:
+        try:
+            result = fut.result()
+        except Exception as e:  # the pool itself broke (e.g. a worker was killed)
+            result = (src, dst, f"{type(e).__name__}: {e}", {}, {})
+        try:
+            self._finish(result)
+        finally:
+            self._slots.release()
+
+    def _finish(self, result: tuple[Path, Path, str | None, dict, dict]) -> None:
+        src, dst, err, out, stats = result
+        if err:
+            print(f"[!] FAILED {src}: {err}")
+            with self._lock:
+                self.failed.append((src, err))
+            return
+        peak = stats["peak_rss_mb"]
+        mem = f", peak {peak:.0f} MB" if peak is not None else ""
+        print(f"Converted: {src} -> {dst} ({stats['seconds']:.2f}s{mem})")
+        with self._lock:
+            self.done[src] = out
+        METRICS.sample("convert", stats["seconds"])
+        for stage, seconds in stats["stages"].items():
+            METRICS.sample(f"convert.{stage}", seconds)
+        if peak is not None:
+            METRICS.maximum("worker_peak_rss_mb", peak)
+        if self.on_done:
+            self.on_done(src, dst, out)
+
+    def close(self) -> tuple[dict[Path, dict], list[tuple[Path, str]]]:
+        if self._pool:
+            self._pool.shutdown()
+        return self.done, self.failed
+
+
+def write_images_data(entries: dict[str, dict]) -> None:
+    """
+    data/images.json: processed path (e.g. external-ssd/samsung/t7/1tb/01_kit/front.webp) ->
+    {"w", "h", "bytes", "hash", "color", "lqip", "srcset": [{"w", "file"}, ...], "avif": [...]}
+    with widths ascending. w/h/bytes/hash describe the canonical <name>.webp; all of it comes
+    from the convert manifest, nothing is re-read from disk.
+    """
+    images: dict[str, dict] = {}
+    for entry in entries.values():
+        variants = entry.get("variants")
+        if not variants:
+            continue
+        dst = Path(entry["dst"])
+        rel = dst.relative_to(LOCAL_PROC).as_posix()
+        info: dict = {}
+        for v in variants:
+            if v["file"] == dst.name:
+                info.update(w=v["w"], h=v["h"])
+        info.update(bytes=entry.get("dst_size"), hash=(entry.get("dst_sha256") or "")[:16])
+        for key in ("color", "lqip"):
+            if key in entry:
+                info[key] = entry[key]
+        info["srcset"] = [{"w": v["w"], "file": v["file"]} for v in variants if v["format"] == "webp"]
+        avif = [{"w": v["w"], "file": v["file"]} for v in variants if v["format"] == "avif"]
+        if avif:
+            info["avif"] = avif
+        images[rel] = info
+    if atomic_write_text(IMAGES_DATA, json.dumps(dict(sorted(images.items())), ensure_ascii=False, indent=2) + "\n"):
+        print(f"Image variants: {IMAGES_DATA} ({len(images)} images)")
+
+
+def write_kit_manifest(entries: dict[str, dict]) -> None:
+    """
+    data/kit_images.json: product path -> sorted names of its 01_kit photos (canonical <name>.webp
+    only, not the -<w>w variants), from the convert manifest. Size and placeholder of each photo
+    are in data/images.json under <product path>/01_kit/<name>.
+    """
+    kit: dict[str, list[str]] = {}
+    for entry in entries.values():
+        dst = Path(entry["dst"])
+        if dst.parent.name == KIT_SUBDIR:
+            kit.setdefault(dst.parent.parent.relative_to(LOCAL_PROC).as_posix(), []).append(dst.name)
+    if not kit:
+        return
+    kit = {product: sorted(names) for product, names in sorted(kit.items())}
+    if atomic_write_text(KIT_MANIFEST, json.dumps(kit, ensure_ascii=False, indent=2) + "\n"):
+        print(f"Kit manifest: {KIT_MANIFEST} ({len(kit)} products)")
+
+
+# -------------------------
+# Push to Drive (02_Processed_WebP) and R2
+# -------------------------
+
+def push_remotes() -> dict[str, str]:
+    """Push destinations by name (looked up at call time, so PROC_ROOT / R2_ROOT can be repointed)."""
+    return {"drive": PROC_ROOT, "r2": R2_ROOT}
+
+
+def load_push_state() -> dict:
+    try:
+        return json.loads(PUSH_STATE.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def save_push_state(state: dict) -> None:
+    atomic_write_text(PUSH_STATE, json.dumps(state, ensure_ascii=False, indent=2, sort_keys=True) + "\n")
+
+
+def queue_changes(state: dict, changes: dict[str, set[str]]) -> None:
+    """Add this run's changes to every remote's pending lists (they stay there until that remote's push succeeds)."""
+    for remote in push_remotes():
+        pending = state.setdefault("pending", {}).setdefault(remote, {"upload": [], "delete": []})
+        upload = (set(pending["upload"]) - changes["delete"]) | changes["upload"]
+        delete = (set(pending["delete"]) - changes["upload"]) | changes["delete"]
+        pending["upload"], pending["delete"] = sorted(upload), sorted(delete)
+
+
+def _files_from(remote: str, kind: str, paths: list[str]) -> Path:
+    path = PUSH_LIST_DIR / f"{remote}-{kind}.txt"
+    atomic_write_text(path, "".join(p + "\n" for p in paths))
+    return path
+
+
+def push_remote(remote: str, dest: str, pending: dict[str, list[str]], full: bool, transfers: int,
+                scope: str | None) -> None:
+    """One destination: `rclone sync` of the tree (or of the --only subtree) when full, else copy + delete of the lists."""
+    opts = ["--checksum", "--transfers", str(transfers), "--checkers", str(transfers * 2)]
+    stage = f"rclone push {remote}"
+    if full:
+        src, dst = (str(LOCAL_PROC / scope), f"{dest}/{scope}") if scope else (str(LOCAL_PROC), dest)
+        run(["rclone", "sync", src, dst, *opts], stage=stage)
+        return
+    if pending["upload"]:
+        cmd = ["rclone", "copy", str(LOCAL_PROC), dest, "--files-from-raw", str(_files_from(remote, "upload", pending["upload"]))]
+        if len(pending["upload"]) <= NO_TRAVERSE_MAX:
+            cmd.append("--no-traverse")
+        run(cmd + opts, stage=stage)
+    if pending["delete"]:
+        run(["rclone", "delete", dest, "--files-from-raw", str(_files_from(remote, "delete", pending["delete"])), *opts],
+            stage=stage)
+
+
+class Uploader:
+    """
+    Pushes converted files while the pipeline is still running, through a bounded queue per push
+    remote. R2 goes file by file over the in-process S3 client (`transfers` threads) when R2_*
+    credentials are set; the other remotes get `rclone copy` batches of whatever queued up during
+    the previous batch. Files that fail stay in the pending lists and publish() pushes them.
+    """
+
+    def __init__(self, transfers: int = RCLONE_TRANSFERS) -> None:
+        self.transfers = transfers
+        self.pushed: dict[str, set[str]] = {}  # remote -> files uploaded by this uploader
+        self._lock = threading.Lock()
+        self._queues: dict[str, queue.Queue] = {}
+        self._threads: dict[str, list[threading.Thread]] = {}
+        s3 = s3_client.from_env(R2_BUCKET)
+        for remote, dest in push_remotes().items():
+            q: queue.Queue = queue.Queue(maxsize=UPLOAD_QUEUE)
+            if remote == "r2" and s3 is not None:
+                threads = [threading.Thread(target=bind_chain(self._s3_worker), args=(remote, q, s3), daemon=True)
+                           for _ in range(transfers)]
+            else:
+                threads = [threading.Thread(target=bind_chain(self._rclone_worker), args=(remote, dest, q), daemon=True)]
+            self.pushed[remote] = set()
+            self._queues[remote] = q
+            self._threads[remote] = threads
+            for t in threads:
+                t.start()
+
+    def put(self, files: list[str]) -> None:
+        """Queue files (relative to LOCAL_PROC) for every remote; waits while a queue is full."""
+        for q in self._queues.values():
+            for rel in files:
+                q.put(rel)
+
+    def close(self) -> dict[str, set[str]]:
+        """Wait for the queued uploads. Returns the files each remote received."""
+        for remote, q in self._queues.items():
+            for _ in self._threads[remote]:
+                q.put(None)
+        for threads in self._threads.values():
+            for t in threads:
+                t.join()
+        return self.pushed
+
+    def _done(self, remote: str, files: list[str]) -> None:
+        with self._lock:
+            self.pushed[remote].update(files)
+        METRICS.count(f"streamed_{remote}", len(files))
+
+    def _s3_worker(self, remote: str, q: queue.Queue, s3: s3_client.S3Client) -> None:
+        while (rel := q.get()) is not None:
+            t0 = time.perf_counter()
+            try:
+                path = LOCAL_PROC / rel
+                s3.put_object(rel, path.read_bytes(), CONTENT_TYPES.get(path.suffix))
+            except Exception as e:
+                print(f"[!] Upload to {remote} failed (left for the final push): {e}")
+                continue
+            METRICS.sample(f"upload.{remote}", time.perf_counter() - t0)
+            self._done(remote, [rel])
+
+    def _rclone_worker(self, remote: str, dest: str, q: queue.Queue) -> None:
+        closing = False
+        while not closing:
+            rel = q.get()
+            if rel is None:
+                return
+            batch = [rel]
+            while len(batch) < UPLOAD_BATCH:
+                try:
+                    rel = q.get_nowait()
+                except queue.Empty:
+                    break
+                if rel is None:
+                    closing = True
+                    break
+                batch.append(rel)
+            cmd = ["rclone", "copy", str(LOCAL_PROC), dest, "--files-from-raw", str(_files_from(remote, "stream", batch)),
+                   "--no-traverse", "--checksum", "--transfers", str(self.transfers)]
+            try:
+                run(cmd, stage=f"rclone stream {remote}")
+            except Exception as e:
+                print(f"[!] Upload to {remote} failed (left for the final push): {e}")
+                continue
+            self._done(remote, batch)
+
+
+def publish(pushed: dict[str, set[str]] | None = None, full: bool = False, transfers: int = RCLONE_TRANSFERS,
+            scope: str | None = None) -> None:
+    """
+    Push to Drive and R2 concurrently: the pending change lists (minus what an Uploader already
+    `pushed`), or a full `rclone sync` with full=True and (for unscoped runs) once
+    FULL_SYNC_INTERVAL has passed since the last one.
+    """
+    state = load_push_state()
+    queue_changes(state, {"upload": set(), "delete": set()})  # every remote gets its (maybe empty) lists
+    for remote, files in (pushed or {}).items():
+        state["pending"][remote]["upload"] = sorted(set(state["pending"][remote]["upload"]) - files)
+    if scope is None and time.time() - state.get("last_full_sync", 0) >= FULL_SYNC_INTERVAL:
+        full = True
+    save_push_state(state)  # before pushing: a failed push is retried by the next run
+
+    pending = state["pending"]
+    n_upload = sum(len(p["upload"]) for p in pending.values())
+    n_delete = sum(len(p["delete"]) for p in pending.values())
+    METRICS.count("push_uploads", n_upload)
+    METRICS.count("push_deletes", n_delete)
+    if not full and not n_upload and not n_delete:
+        print("[i] Nothing to push")
+        return
+    remotes = push_remotes()
+    for remote in remotes:
+        p = pending[remote]
+        print(f"Push {remote}: " + ("full sync" if full else f"{len(p['upload'])} upload(s), {len(p['delete'])} delete(s)"))
+
+    with ThreadPoolExecutor(max_workers=len(remotes)) as pool:
+        futures = {
+            remote: pool.submit(bind_chain(push_remote), remote, dest, pending[remote], full, transfers, scope)
+            for remote, dest in remotes.items()
+        }
+    errors = []
+    for remote, fut in futures.items():
+        try:
+            fut.result()
+        except Exception as e:
+            print(f"[!] Push to {remote} failed: {e}")
+            errors.append(e)
+            continue
+        # A scoped full sync only covers its subtree: keep the lists for the rest
+        if not (full and scope):
+            pending[remote] = {"upload": [], "delete": []}
+    if full and not scope and not errors:
+        state["last_full_sync"] = int(time.time())
+    save_push_state(state)
+    if errors:
+        raise errors[0]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Eugen Standard photo pipeline: RAW -> WebP -> Drive + R2")
+    ap.add_argument("--force", action="store_true",
+                    help="re-convert all images (normally not needed: source and settings changes are detected)")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                    help="parallel conversion workers (default: CPU count)")
+    ap.add_argument("--only", metavar="PATH",
+                    help="limit pull, conversion and push to one subtree, e.g. external-ssd/<brand>/<model>/<capacity>")
+    ap.add_argument("--full-sync", action="store_true",
+                    help="push with a full `rclone sync` of the tree instead of the change list")
+    ap.add_argument("--transfers", type=int, default=RCLONE_TRANSFERS,
+                    help=f"parallel transfers per destination (default: {RCLONE_TRANSFERS})")
+    ap.add_argument("--profile", action="store_true", help="print stage timings and counters at the end")
+    ap.add_argument("--metrics-json", metavar="PATH", help="write stage timings and counters as JSON")
+    return ap.parse_args(argv)
+
+
+def process(args: argparse.Namespace, uploader: "Uploader | None" = None) -> list[tuple[Path, str]]:
+    """
+    Pull RAW, convert what changed and write the manifests (data/images.json, data/kit_images.json)
+    as one pipeline: files convert as soon as they are downloaded and each output goes to `uploader`
+    right away. The run's uploads and deletions are recorded in PUSH_STATE for publish().
+    Returns the failed conversions. sync_all.py starts the review pages as soon as this returns.
+    """
+    force = args.force
+    scope = normalize_scope(args.only)
     if force:
         print("Force mode: re-converting all images (watermark will be applied)")
     ensure_dirs()
 
-    # 1) Pull RAW from Drive -> local
-    # NOTE: --checksum avoids relying on timestamps from cloud providers.
-    run(["rclone", "sync", RAW_ROOT, str(LOCAL_RAW), "--checksum"])
-
-    # 2) Convert all RAW images while mirroring folders (auto-includes all model subfolders)
-    converted = 0
     scanned = 0
     expected_webp: set[Path] = set()
-
-    for src in LOCAL_RAW.rglob("*"):
-        if not src.is_file() or src.suffix.lower() not in IMAGE_EXTS:
-            continue
+    manifest = load_convert_manifest()
+    fingerprint = settings_fingerprint()
+    seen: dict[str, dict] = {}  # manifest entries for sources still present
+    src_keys: dict[Path, str] = {}
+
+    def outputs(dst: Path, out: dict) -> list[str]:
+        files = {dst.relative_to(LOCAL_PROC).as_posix()}
+        files.update((dst.parent / v["file"]).relative_to(LOCAL_PROC).as_posix() for v in out["variants"])
+        return sorted(files)
+
+    converter = ConvertPool(args.jobs, (lambda src, dst, out: uploader.put(outputs(dst, out))) if uploader else None)
+
+    def consider(src: Path) -> None:
+        nonlocal scanned
+        if src in src_keys or not src.is_file() or src.suffix.lower() not in IMAGE_EXTS:
+            return
+        rel_dir = rel_dir_lower(src.parent.relative_to(LOCAL_RAW))
+        if not in_scope(rel_dir.as_posix(), scope):
+            return
         scanned += 1
 
-        rel_dir = src.parent.relative_to(LOCAL_RAW)
-        dst_dir = LOCAL_PROC / rel_dir_lower(rel_dir)
+        dst_dir = LOCAL_PROC / rel_dir
         if src.name.lower() == RAW_NAME:
             dst = dst_dir / OUT_NAME
         else:
@@ -157,44 +819,106 @@ def main() -> None:
 
         expected_webp.add(dst.resolve())
 
-        # Convert if output missing OR input newer than output OR --force
-        if force or (not dst.exists()) or (src.stat().st_mtime > dst.stat().st_mtime):
-            convert_one(src, dst)
-            converted += 1
+        # Convert if source content, encoder settings or output differ from the manifest (or --force).
+        # Content hashes, not mtimes: rclone --checksum does not keep mtimes meaningful.
+        key = src.relative_to(LOCAL_RAW).as_posix()
+        src_keys[src] = key
+        src_hash = file_sha256(src)
+        entry = manifest.get(key)
+        if force or needs_convert(entry, src_hash, fingerprint, dst):
+            seen[key] = {"src_sha256": src_hash, "settings": fingerprint, "dst": dst.as_posix()}
+            converter.submit(src, dst)
+        else:
+            seen[key] = entry
+
+    try:
+        # 1) Pull RAW from Drive -> local; downloaded files start converting right away
+        pull_raw(scope, consider)
+
+        # 2) Everything not downloaded this run that still needs converting
+        # (new settings, missing outputs, --force, earlier failures; auto-includes all model subfolders)
+        with METRICS.stage("scan"):
+            # Sorted walk: same task order (and log order) on every run and platform.
+            for src in sorted(LOCAL_RAW.rglob("*")):
+                consider(src)
+    finally:
+        with METRICS.stage("convert (remaining)"):
+            done, failed = converter.close()
+
+    if scope:
+        # Outside --only: keep the last conversions as they are (not hashed, not reconverted, not removed)
+        for key, entry in manifest.items():
+            dst = Path(entry["dst"])
+            if key not in seen and not in_scope(dst.parent.relative_to(LOCAL_PROC).as_posix(), scope):
+                seen[key] = entry
+                expected_webp.add(dst.resolve())
+
+    converted = len(done)
+    METRICS.count("images_scanned", scanned)
+    METRICS.count("images_converted", converted)
+    METRICS.count("images_failed", len(failed))
+    changes: dict[str, set[str]] = {"upload": set(), "delete": set()}
+    for src, out in done.items():
+        entry = seen[src_keys[src]]
+        entry.update(out)
+        changes["upload"].update(outputs(Path(entry["dst"]), out))
+    expected_files = set(expected_webp)
+    published = dict(seen)  # what the data files describe: failed sources keep their last good output
+    for src, _err in failed:
+        # Keep whatever the last good conversion produced; retried on the next run
+        key = src_keys[src]
+        old = manifest.get(key) or {}
+        expected_files.update((Path(old.get("dst", "")).parent / v["file"]).resolve() for v in old.get("variants", []))
+        seen.pop(key, None)
+        if old.get("dst") == published[key]["dst"]:
+            published[key] = old
+        else:
+            published.pop(key)
+    for entry in seen.values():
+        expected_files.update((Path(entry["dst"]).parent / v["file"]).resolve() for v in entry.get("variants", []))
 
     # 2b) Remove orphaned processed files to keep output mirrored to RAW
-    for proc_webp in LOCAL_PROC.rglob("*.webp"):
-        if proc_webp.resolve() not in expected_webp:
-            proc_webp.unlink()
-
-    # 2c) Build kit manifest from processed 01_kit/*.webp (for Hugo to auto-display all photos)
-    kit_manifest: dict[str, list[str]] = {}  # product_path -> sorted list of .webp filenames
-    for kit_dir in LOCAL_PROC.rglob(KIT_SUBDIR):
-        if not kit_dir.is_dir():
-            continue
-        rel_dir = kit_dir.parent.relative_to(LOCAL_PROC)
-        product_path = str(rel_dir).replace("\\", "/")
-        files = sorted(f.name for f in kit_dir.glob("*.webp"))
-        if files:
-            kit_manifest[product_path] = files
-
-    if kit_manifest:
-        manifest_path = Path("data/kit_images.json")
-        manifest_path.parent.mkdir(parents=True, exist_ok=True)
-        manifest_path.write_text(json.dumps(kit_manifest, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-        print(f"Kit manifest: {manifest_path} ({len(kit_manifest)} products)")
+    proc_root = LOCAL_PROC / scope if scope else LOCAL_PROC
+    for pattern in ("*.webp", "*.avif"):
+        for proc_file in proc_root.rglob(pattern):
+            if proc_file.resolve() not in expected_files:
+                proc_file.unlink()
+                changes["delete"].add(proc_file.relative_to(LOCAL_PROC).as_posix())
+
+    # Pending pushes are saved before the convert manifest: a crash in between re-pushes, never skips
+    state = load_push_state()
+    queue_changes(state, changes)
+    save_push_state(state)
+    save_convert_manifest(seen)
+
+    # 2c) Variants, dimensions and placeholders per processed image (for srcset / width / height in Hugo)
+    write_images_data(published)
+
+    # 2d) Kit manifest from the same entries (for Hugo to auto-display all 01_kit photos)
+    write_kit_manifest(published)
 
     print(f"RAW files found: {scanned}")
     print(f"Converted: {converted}")
+    if failed:
+        print(f"Failed: {len(failed)}")
+    return failed
 
-    # 3) Push Processed back to Drive
-    run(["rclone", "sync", str(LOCAL_PROC), PROC_ROOT, "--checksum"])
-
-    # 4) Upload Processed to R2 bucket root (keeps same paths)
-    run(["rclone", "sync", str(LOCAL_PROC), R2_ROOT, "--checksum"])
 
+def main() -> None:
+    args = parse_args()
+    uploader = Uploader(args.transfers)
+    try:
+        failed = process(args, uploader)
+    finally:
+        pushed = uploader.close()
+    publish(pushed, full=args.full_sync, transfers=args.transfers, scope=normalize_scope(args.only))
+    if failed:
+        # Everything else is published; non-zero exit so cron surfaces the broken files.
+        for src, err in failed:
+            print(f"[!] {src}: {err}")
+        sys.exit(1)
     print("DONE")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    raise SystemExit(run_main("photo", main))
\ No newline at end of file
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Minimal S3-compatible client (PUT / DELETE object) for Cloudflare R2, standard library only.
+
+Requests are signed with AWS Signature Version 4 (path-style URLs; R2 uses region "auto") and
+sent over a keep-alive sync_io.ConnectionPool, so photo.py can upload each converted WebP as
+soon as it exists instead of waiting for an `rclone sync` of the whole tree.
+
+Configured from the environment (from_env() returns None when any of these is missing):
+
+    R2_ENDPOINT            https://<account id>.r2.cloudflarestorage.com
+    R2_ACCESS_KEY_ID       R2 API token key id
+    R2_SECRET_ACCESS_KEY   R2 API token secret
+    R2_BUCKET              optional, overrides the bucket photo.py passes in
+
+Any S3 API endpoint works, e.g. the local stand-in bench_photo.py serves for its end-to-end run.
+"""
+
+import hashlib
+import hmac
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from urllib.parse import quote, urlsplit
+
+from sync_io import ConnectionPool
+
+S3_RETRIES = 3  # attempts per request on 5xx / connection errors
+S3_RETRY_WAIT = 0.5  # seconds before the first retry, doubled after that
+S3_TIMEOUT = 120  # seconds per request
+
+
+class S3Error(Exception):
+    pass
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def sign_v4(method: str, url: str, payload_sha256: str, access_key: str, secret_key: str,
+            region: str = "auto", now: Optional[datetime] = None) -> Dict[str, str]:
+    """
+    Headers for a SigV4-signed request (Host, x-amz-date, x-amz-content-sha256, Authorization).
+    `url` must already be percent-encoded; only host and the two x-amz headers are signed.
+    """
+    parts = urlsplit(url)
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    day = amz_date[:8]
+    signed_headers = "host;x-amz-content-sha256;x-amz-date"
+    canonical = "\n".join((
+        method,
+        parts.path or "/",
+        "&".join(sorted(q for q in parts.query.split("&") if q)),
+        f"host:{parts.netloc}\nx-amz-content-sha256:{payload_sha256}\nx-amz-date:{amz_date}\n",
+        signed_headers,
+        payload_sha256,
+    ))
+    scope = f"{day}/{region}/s3/aws4_request"
+    to_sign = "\n".join(("AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode("utf-8")).hexdigest()))
+    key = _hmac(_hmac(_hmac(_hmac(("AWS4" + secret_key).encode("utf-8"), day), region), "s3"), "aws4_request")
+    signature = hmac.new(key, to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    return {
+        "Host": parts.netloc,
+        "x-amz-date": amz_date,
+        "x-amz-content-sha256": payload_sha256,
+        "Authorization": f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                         f"SignedHeaders={signed_headers}, Signature={signature}",
+    }
+
+
+class S3Client:
+    """PUT / DELETE of single objects in one bucket. Thread-safe (connections come from a shared pool)."""
+
+    def __init__(self, endpoint: str, bucket: str, access_key: str, secret_key: str, region: str = "auto") -> None:
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.pool = ConnectionPool(timeout=S3_TIMEOUT)
+
+    def url(self, key: str) -> str:
+        return f"{self.endpoint}/{quote(self.bucket)}/{quote(key, safe='/-_.~')}"
+
+    def _request(self, method: str, key: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> int:
+        url = self.url(key)
+        payload_sha256 = hashlib.sha256(body).hexdigest()
+        for attempt in range(S3_RETRIES):
+            if attempt:
+                time.sleep(S3_RETRY_WAIT * 2 ** (attempt - 1))
+            hdrs = dict(headers or {})
+            hdrs.update(sign_v4(method, url, payload_sha256, self.access_key, self.secret_key, self.region))
+            try:
+                status, data = self.pool.request(method, url, hdrs, body if method == "PUT" else None)
+            except OSError as e:
+                error = S3Error(f"{method} {key}: {e}")
+                continue
+            if status < 300 or (method == "DELETE" and status == 404):
+                return status
+            error = S3Error(f"{method} {key}: HTTP {status} {data[:200].decode('utf-8', 'replace')}")
+            if status < 500:
+                break
+        raise error
+
+    def put_object(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        self._request("PUT", key, data, {"Content-Type": content_type} if content_type else None)
+
+    def delete_object(self, key: str) -> None:
+        """Missing objects are not an error."""
+        self._request("DELETE", key)
+
+
+def from_env(bucket: str, prefix: str = "R2_") -> Optional[S3Client]:
+    """S3Client from <prefix>ENDPOINT / ACCESS_KEY_ID / SECRET_ACCESS_KEY (/ BUCKET), or None if not configured."""
+    endpoint = os.environ.get(prefix + "ENDPOINT")
+    access_key = os.environ.get(prefix + "ACCESS_KEY_ID")
+    secret_key = os.environ.get(prefix + "SECRET_ACCESS_KEY")
+    if not (endpoint and access_key and secret_key):
+        return None
+    return S3Client(endpoint, os.environ.get(prefix + "BUCKET") or bucket, access_key, secret_key)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One entry point for the whole sync: models sheet, reviews sheet and photos, run concurrently.
+
+    python scripts/sync_all.py [--force] [--offline] [--no-photos] [--data-files] [-j N] [--transfers N]
+                               [--full-sync] [--profile] [--metrics-json PATH]
+
+Three chains run side by side; only the real dependency is kept:
+
+    models:  fetch models sheet  -> calculator + data pages
+    reviews: fetch reviews sheet -> (wait for kit manifest) -> review pages
+    photos:  pull RAW -> convert -> upload (streamed) + manifests -> push the rest to Drive / R2
+
+Review pages read data/kit_images.json, so they start as soon as photo.process() has written
+it; the rclone pushes overlap with them. Both sheets are fetched at the same time over the
+shared keep-alive pool (sync_io.HTTP_POOL). Wall time is about the slowest chain instead of
+the sum of the three scripts. The single scripts still work on their own.
+
+Each chain runs in sync_io.chain(name): its "Files:" summary counts only its own writes, and
+the one --profile / --metrics-json report lists stages and counters per chain ("models/fetch",
+"reviews/files_written", ...) next to the totals.
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import photo
+import sync_gsheet_models as models
+import sync_gsheet_reviews as reviews
+from sync_io import METRICS, chain, fetch_sheet, run_main
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Eugen Standard sync: models + reviews sheets and photos, concurrently")
+    ap.add_argument("--force", action="store_true", help="regenerate all pages and re-convert all images")
+    ap.add_argument("--offline", action="store_true",
+                    help="use the cached sheets and skip the photo pipeline (it needs Drive)")
+    ap.add_argument("--no-photos", action="store_true",
+                    help="sheets only; review pages use the existing data/kit_images.json")
+    ap.add_argument("--data-files", action="store_true",
+                    help="data pages as Hugo data files plus front-matter stubs (sync_gsheet_models.py --data-files)")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1,
+                    help="parallel image conversion workers (default: CPU count)")
+    ap.add_argument("--transfers", type=int, default=photo.RCLONE_TRANSFERS,
+                    help=f"parallel rclone transfers per destination (default: {photo.RCLONE_TRANSFERS})")
+    ap.add_argument("--full-sync", action="store_true", help="push photos with a full `rclone sync` of the tree")
+    ap.add_argument("--profile", action="store_true", help="print stage timings and counters at the end")
+    ap.add_argument("--metrics-json", metavar="PATH", help="write stage timings and counters as JSON")
+    return ap.parse_args(argv)
+
+
+def run_in_chain(name: str, fn: Callable[[], bool]) -> bool:
+    with chain(name):
+        return fn()
+
+
+def run_chains(args: argparse.Namespace) -> List[str]:
+    """Run the three chains on their own threads. Returns the names of the chains that failed."""
+    photos = not (args.offline or args.no_photos)
+    kit_ready = threading.Event()  # set once data/kit_images.json is final for this run
+    if not photos:
+        kit_ready.set()
+
+    def models_chain() -> bool:
+        try:
+            with METRICS.stage("fetch"):
+                csv_path, digest = fetch_sheet(models.CSV_URL, models.SHEET_CACHE_NAME, offline=args.offline)
+        except FileNotFoundError as e:  # --offline without a cached copy
+            print(f"[!] {e}")
+            return False
+        return models.generate(csv_path, digest, force=args.force, data_files=args.data_files) == 0
+
+    def reviews_chain() -> bool:
+        try:
+            with METRICS.stage("fetch"):
+                csv_path, digest = fetch_sheet(reviews.CSV_URL, reviews.SHEET_CACHE_NAME, offline=args.offline)
+        except FileNotFoundError as e:  # --offline without a cached copy
+            print(f"[!] {e}")
+            return False
+        with METRICS.stage("wait for kit manifest"):
+            kit_ready.wait()
+        return reviews.generate(csv_path, digest, force=args.force) == 0
+
+    def photos_chain() -> bool:
+        uploader = photo.Uploader(args.transfers)
+        try:
+            failed = photo.process(photo.parse_args(["--jobs", str(args.jobs)] + (["--force"] if args.force else [])),
+                                   uploader)
+        finally:
+            # Also on failure: the reviews then use the previous manifest, as a separate run would.
+            kit_ready.set()
+            pushed = uploader.close()
+        photo.publish(pushed, full=args.full_sync, transfers=args.transfers)
+        # Everything else is published; the broken files fail the run.
+        for src, err in failed:
+            print(f"[!] {src}: {err}")
+        return not failed
+
+    chains: Dict[str, Callable[[], bool]] = {"models": models_chain, "reviews": reviews_chain}
+    if photos:
+        chains["photos"] = photos_chain
+
+    failures: List[str] = []
+    with ThreadPoolExecutor(max_workers=len(chains), thread_name_prefix="sync") as pool:
+        # Each chain reports its own stages and file counts ("models/fetch", ...) in the one run report
+        futures = {name: pool.submit(run_in_chain, name, fn) for name, fn in chains.items()}
+        for name, fut in futures.items():
+            try:
+                ok = fut.result()
+            except Exception:
+                print(f"[!] {name} failed:")
+                traceback.print_exc()
+                ok = False
+            if not ok:
+                failures.append(name)
+    return failures
+
+
+def main() -> int:
+    args = parse_args()
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        photo.POOL_START_METHOD = "forkserver"
+    failures = run_chains(args)
+    if failures:
+        print(f"[!] Sync finished with failures: {', '.join(failures)}")
+        return 1
+    print("DONE")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(run_main("sync_all", main))
@@ -1,14 +1,28 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import csv
+import hashlib
 import json
 import re
+import shutil
+import sys
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-from urllib.request import urlopen
+from typing import Callable, Dict, Hashable, List, Set, Tuple, Optional
+
+from measurements import Measurement, MeasurementStore, Product, fnum
+from warehouse import Warehouse
+
+try:
+    import calc_engine  # optional: needs numpy; without it shards carry no precomputed ranking
+except ImportError:
+    calc_engine = None
+from sync_io import (
+    METRICS, WRITE_STATS, atomic_write_text, build_stamp, fetch_sheet, is_up_to_date, mark_built, read_csv,
+    run_main, write_precompressed,
+)
 
 CSV_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSNY87-WIChWcLHd8Ilyx4Smy8hxRC690C4wjhb_yLgfi3uooSD91Pw6TZiK83n269O8AC_3koMsI1-/pub?gid=0&single=true&output=csv"
+SHEET_CACHE_NAME = "models"  # .tmp/gsheet/models.csv
 
 OUT_ROOT = Path("content")
 TARGET_LANGS = ("en", "de", "fr")
@@ -19,39 +33,51 @@ CALC_CATEGORY = "external-ssd"
 CALC_SLUG = "read-write-time-calculator"
 CALC_REL_DIR = CALC_SECTION_DIR / CALC_CATEGORY / CALC_SLUG
 
+# Calculator data: one shard per category, static/data/calculator/<category>.<hash>.json (+ .gz/.br),
+# referenced through data/calculator.json (Hugo data) by layouts/_default/calculator.html
+CALC_DATA_DIR = Path("static/data/calculator")
+CALC_MANIFEST_PATH = Path("data/calculator.json")
+CALC_DATA_VERSION = 2
+CALC_HASH_LEN = 12
+
 # For Hugo translation linking (language switch, relref stability, etc.)
 CALC_TRANSLATION_KEY = "calc-external-ssd-read-write-time"
 
+# --data-files: per-product measurements read by layouts/data/single.html via site.Data.measurements
+MEASUREMENTS_DATA_DIR = Path("data/measurements")
+
+
+class RenderCache:
+    """
+    Page bodies memoized by their inputs, so a page that is identical in several languages
+    (EN rows reused for DE/FR fallback) is rendered once and only written per language path.
+    """
+
+    def __init__(self) -> None:
+        self._bodies: Dict[Hashable, str] = {}
+        self.renders = 0
+        self.shared = 0
+
+    def get(self, key: Hashable, render: Callable[[], str]) -> str:
+        body = self._bodies.get(key)
+        if body is None:
+            body = self._bodies[key] = render()
+            self.renders += 1
+        else:
+            self.shared += 1
+        return body
+
+    def summary(self) -> str:
+        return f"{self.renders} rendered, {self.shared} shared"
+
+
+RENDER_CACHE = RenderCache()
+
 
 # -------------------------
 # CSV helpers
 # -------------------------
 
-def norm_header(h: str) -> str:
-    h = (h or "").strip()
-    h = h.replace(" ", "_")
-    h = re.sub(r"[^a-zA-Z0-9_]", "", h)
-    return h.lower()
-
-
-def read_csv(url: str) -> List[Dict[str, str]]:
-    sep = "&" if "?" in url else "?"
-    raw = urlopen(f"{url}{sep}ts={__import__('time').time_ns()}").read().decode("utf-8", errors="replace")
-    reader = csv.reader(raw.splitlines())
-    rows = list(reader)
-    if not rows:
-        return []
-
-    headers = [norm_header(h) for h in rows[0]]
-    out: List[Dict[str, str]] = []
-    for line in rows[1:]:
-        d: Dict[str, str] = {}
-        for i, h in enumerate(headers):
-            d[h] = (line[i] if i < len(line) else "").strip()
-        out.append(d)
-    return out
-
-
 def truthy(v: str) -> bool:
     return str(v).strip().lower() in ("true", "1", "yes")
 
@@ -84,47 +110,23 @@ def humanize_slug(s: str) -> str:
     return " ".join(out)
 
 
-def split_rows_by_lang(rows: List[Dict[str, str]], default_lang: str = "en") -> Dict[str, List[Dict[str, str]]]:
-    by: Dict[str, List[Dict[str, str]]] = {}
-    for r in rows:
-        lang = (r.get("lang") or "").strip().lower() or default_lang
-        r["lang"] = lang
-        by.setdefault(lang, []).append(r)
-    return by
-
-
 def html_escape(s: str) -> str:
     return (s or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
 
-def fnum(x: str) -> Optional[float]:
-    x = (x or "").strip()
-    if not x:
-        return None
-    try:
-        return float(x)
-    except Exception:
-        try:
-            return float(x.replace(",", "."))
-        except Exception:
-            return None
-
-
-def atomic_write_text(path: Path, text: str, encoding: str = "utf-8") -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    tmp.write_text(text, encoding=encoding, newline="\n")
-    tmp.replace(path)
-
-
 # -------------------------
 # Calculator JSON
 # -------------------------
 
-def build_calculator_json(rows: List[Dict[str, str]]) -> List[Dict]:
+# String columns go through the shard's string table; numeric columns are plain arrays (null = not measured).
+CALC_STRING_COLUMNS = ("brand", "model", "capacity_label", "brand_slug", "model_slug", "capacity_slug")
+CALC_NUMBER_COLUMNS = ("capacity_gib", "slc_speed", "slc_gib", "sustained_speed", "read_speed")
+
+
+def build_calculator_rows(products: List[Product]) -> List[Dict]:
     """
-    Build a single JSON used by calculator UI.
-    Reads from EN rows (recommended) to avoid duplicates if DE appears later.
+    One row per category/brand/model/capacity for the calculator UI, sorted by that path.
+    Reads from EN products (recommended) to avoid duplicates if DE appears later.
 
     Uses:
       section_key: fresh_seq_write_250gib, seq_read_250gib
@@ -132,76 +134,119 @@ def build_calculator_json(rows: List[Dict[str, str]]) -> List[Dict]:
       avg_median : numeric
     """
 
-    def pick(model_rows: List[Dict[str, str]], section_key: str, metric_key: str) -> Optional[float]:
-        for rr in model_rows:
-            if (rr.get("section_key") or "").strip() == section_key and (rr.get("metric_key") or "").strip() == metric_key:
-                return fnum(rr.get("avg_median") or "")
-        return None
+    grouped: Dict[str, List[Product]] = {}
+    for p in products:
+        grouped.setdefault(p.path_key, []).append(p)
 
-    grouped: Dict[str, List[Dict[str, str]]] = {}
-    meta: Dict[str, Dict[str, str]] = {}
+    def pick(ps: List[Product], section_key: str, metric_key: str) -> Optional[float]:
+        for p in ps:
+            m = p.metric(section_key, metric_key)
+            if m:
+                return m.value
+        return None
 
-    for r in rows:
-        category = (r.get("category") or "").strip()
-        brand_slug = (r.get("brand_slug") or "").strip()
-        model_slug = (r.get("model_slug") or "").strip()
-        cap_slug = (r.get("capacity_slug") or "").strip()
+    out: List[Dict] = []
+    for key in sorted(grouped.keys()):
+        ps = grouped[key]
+        p0 = ps[0]
+        out.append({
+            "category": p0.category,
+            "brand": p0.brand,
+            "model": p0.model,
+            "capacity_label": p0.capacity_label,
+            "brand_slug": p0.brand_slug,
+            "model_slug": p0.model_slug,
+            "capacity_slug": p0.capacity_slug,
+            "capacity_gib": fnum(p0.capacity_gib),
+            "slc_speed": pick(ps, "fresh_seq_write_250gib", "slc_speed_mb_s"),
+            "slc_gib": pick(ps, "fresh_seq_write_250gib", "slc_data_gib"),
+            "sustained_speed": pick(ps, "fresh_seq_write_250gib", "sustained_speed_mb_s"),
+            "read_speed": pick(ps, "seq_read_250gib", "avg_speed_mb_s"),
+        })
+    return out
 
-        if not (category and brand_slug and model_slug and cap_slug):
-            continue
 
-        key = f"{category}/{brand_slug}/{model_slug}/{cap_slug}"
-        grouped.setdefault(key, []).append(r)
+def _compact_num(v: Optional[float]):
+    if v is None:
+        return None
+    return int(v) if float(v).is_integer() else v
 
-        if key not in meta:
-            meta[key] = {
-                "category": category,
-                "brand": (r.get("brand") or "").strip(),
-                "model": (r.get("model") or "").strip(),
-                "capacity_label": (r.get("capacity_label") or "").strip(),
-                "brand_slug": brand_slug,
-                "model_slug": model_slug,
-                "capacity_slug": cap_slug,
-            }
 
-    out: List[Dict] = []
-    for key in sorted(grouped.keys()):
-        rs = grouped[key]
-        m = meta[key]
+def pack_calculator_shard(category: str, rows: List[Dict]) -> Dict:
+    """
+    Columnar calculator data for one category (format CALC_DATA_VERSION):
+      {"v": 2, "category": ..., "n": rows, "strings": [...],
+       "cols": {"brand": [string index, ...], ..., "slc_speed": [number | null, ...], ...}}
+    Repeated brands/labels are stored once; id and display name are derived client-side.
+    build_calculator_json may add "rank" (see calc_engine.rank_shard).
+    """
+    strings: List[str] = []
+    index: Dict[str, int] = {}
 
-        slc_speed = pick(rs, "fresh_seq_write_250gib", "slc_speed_mb_s")
-        sustained_speed = pick(rs, "fresh_seq_write_250gib", "sustained_speed_mb_s")
-        slc_size_gib = pick(rs, "fresh_seq_write_250gib", "slc_data_gib")
-        read_speed = pick(rs, "seq_read_250gib", "avg_speed_mb_s")
+    def sid(s: str) -> int:
+        i = index.get(s)
+        if i is None:
+            i = index[s] = len(strings)
+            strings.append(s)
+        return i
 
-        item = {
-            "id": f"{m['brand_slug']}_{m['model_slug']}_{m['capacity_slug']}",
-            "name": f"{m['brand']} {m['model']} {m['capacity_label']}".strip(),
+    cols: Dict[str, List] = {c: [] for c in CALC_STRING_COLUMNS + CALC_NUMBER_COLUMNS}
+    for r in rows:
+        for c in CALC_STRING_COLUMNS:
+            cols[c].append(sid(r.get(c) or ""))
+        for c in CALC_NUMBER_COLUMNS:
+            cols[c].append(_compact_num(r.get(c)))
 
-            **m,
+    return {"v": CALC_DATA_VERSION, "category": category, "n": len(rows), "strings": strings, "cols": cols}
 
-            "slc_speed": slc_speed,
-            "slc_size_gib": slc_size_gib,
-            "sustained_speed": sustained_speed,
-            "read_speed": read_speed,
 
-            "slcSpeed": slc_speed,
-            "slcGiB": slc_size_gib,
-            "sustainedSpeed": sustained_speed,
-            "readSpeed": read_speed,
-        }
-        out.append(item)
+def build_calculator_json(products: List[Product]) -> Dict[str, Dict]:
+    """
+    Calculator data as one columnar shard per category: {category: shard}.
+    With numpy available each shard also gets "rank": the ordering per mode and the sizes where it changes.
+    """
+    by_category: Dict[str, List[Dict]] = {}
+    for r in build_calculator_rows(products):
+        by_category.setdefault(r["category"], []).append(r)
 
-    return out
+    shards: Dict[str, Dict] = {}
+    for cat, rows in sorted(by_category.items()):
+        shard = shards[cat] = pack_calculator_shard(cat, rows)
+        if calc_engine is not None:
+            shard["rank"] = calc_engine.rank_shard(shard)
+    return shards
 
 
-def write_calculator_json(models: List[Dict]) -> None:
-    out_file = Path("static/data/calculator.json")
-    out_file.parent.mkdir(parents=True, exist_ok=True)
-    tmp_file = out_file.with_suffix(out_file.suffix + ".tmp")
-    tmp_file.write_text(json.dumps(models, ensure_ascii=False, indent=2) + "\n", encoding="utf-8", newline="\n")
-    tmp_file.replace(out_file)
-    print(f"Calculator JSON generated: {out_file}")
+def write_calculator_json(shards: Dict[str, Dict], partial: bool = False) -> None:
+    """
+    Write each shard under a content-hashed name (immutable, long-cacheable), then the
+    manifest Hugo reads to reference (or inline) it. Superseded fingerprints are removed.
+    With partial=True, `shards` holds only the rebuilt categories; the others keep their manifest entry and file.
+    """
+    manifest: Dict[str, Dict] = {}
+    keep = set()
+    if partial and CALC_MANIFEST_PATH.exists():
+        for category, entry in json.loads(CALC_MANIFEST_PATH.read_text(encoding="utf-8")).items():
+            if category not in shards:
+                manifest[category] = entry
+                keep.add(entry["file"].rsplit("/", 1)[-1])
+    for category, shard in shards.items():
+        data = json.dumps(shard, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        name = f"{category}.{hashlib.sha256(data).hexdigest()[:CALC_HASH_LEN]}.json"
+        out_file = CALC_DATA_DIR / name
+        if write_precompressed(out_file, data):
+            print(f"Calculator JSON generated: {out_file} ({shard['n']} models, {len(data)} bytes)")
+        keep.add(name)
+        manifest[category] = {"file": f"/data/calculator/{name}", "bytes": len(data), "v": CALC_DATA_VERSION}
+
+    manifest = dict(sorted(manifest.items()))
+    if atomic_write_text(CALC_MANIFEST_PATH, json.dumps(manifest, ensure_ascii=False, indent=2) + "\n"):
+        print(f"Calculator manifest: {CALC_MANIFEST_PATH}")
+
+    for f in CALC_DATA_DIR.glob("*.json*"):
+        if f.name.split(".json")[0] + ".json" not in keep:
+            f.unlink()
+            print(f"Removed stale calculator data: {f}")
 
 
 # -------------------------
@@ -231,8 +276,8 @@ def build_calculators_section_index_md(lang: str) -> str:
 def write_calculators_section_index_pages() -> None:
     for lang in TARGET_LANGS:
         out_file = OUT_ROOT / lang / CALC_SECTION_DIR / "_index.md"
-        atomic_write_text(out_file, build_calculators_section_index_md(lang))
-        print(f"Calculators section index: {out_file}")
+        if atomic_write_text(out_file, build_calculators_section_index_md(lang)):
+            print(f"Calculators section index: {out_file}")
 
 
 def build_calc_category_index_md(lang: str) -> str:
@@ -255,9 +300,8 @@ def build_calc_category_index_md(lang: str) -> str:
 def write_calc_category_index_pages() -> None:
     for lang in TARGET_LANGS:
         out_file = OUT_ROOT / lang / CALC_SECTION_DIR / CALC_CATEGORY / "_index.md"
-        out_file.parent.mkdir(parents=True, exist_ok=True)
-        atomic_write_text(out_file, build_calc_category_index_md(lang))
-        print(f"Calc category index: {out_file}")
+        if atomic_write_text(out_file, build_calc_category_index_md(lang)):
+            print(f"Calc category index: {out_file}")
 
 
 def build_calculator_md(lang: str) -> str:
@@ -278,6 +322,7 @@ def build_calculator_md(lang: str) -> str:
     lines.append(f'translationKey: "{CALC_TRANSLATION_KEY}"')
     lines.append('layout: "calculator"')
     lines.append(f'slug: "{CALC_SLUG}"')  # URL segment under category
+    lines.append(f'calcCategory: "{CALC_CATEGORY}"')  # shard key in data/calculator.json
     lines.append("---")
     lines.append("")
     return "\n".join(lines)
@@ -286,27 +331,19 @@ def build_calculator_md(lang: str) -> str:
 def write_calculator_pages() -> None:
     for lang in TARGET_LANGS:
         out_dir = OUT_ROOT / lang / CALC_REL_DIR
-        out_dir.mkdir(parents=True, exist_ok=True)
         out_file = out_dir / "index.md"
-        atomic_write_text(out_file, build_calculator_md(lang))
-        print(f"Calculator page: {out_file}")
+        if atomic_write_text(out_file, build_calculator_md(lang)):
+            print(f"Calculator page: {out_file}")
 
 
 # -------------------------
 # Data pages Markdown generation (i18n-safe keys in data-attrs)
 # -------------------------
 
-def build_md(page_rows: List[Dict[str, str]]) -> str:
-    r0 = page_rows[0]
-
-    brand = (r0.get("brand") or "").strip()
-    model = (r0.get("model") or "").strip()
-    cap_label = (r0.get("capacity_label") or "").strip()
-
-    brand_slug = (r0.get("brand_slug") or "").strip()
-    model_slug = (r0.get("model_slug") or "").strip()
-    cap_slug = (r0.get("capacity_slug") or "").strip()
-    category = (r0.get("category") or "").strip()
+def _front_matter(product: Product, *extra: str) -> List[str]:
+    brand = product.brand
+    model = product.model
+    cap_label = product.capacity_label
 
     title = f"{brand} {model} {cap_label} - Raw Test Data"
     description = (
@@ -314,54 +351,53 @@ def build_md(page_rows: List[Dict[str, str]]) -> str:
         f"conducted in a controlled test environment in accordance with the standardized Eugen Standard methodology."
     )
 
-    capacity_gib = (r0.get("capacity_gib") or "").strip()
-    serial_number = (r0.get("serial_number") or "").strip()
-    firmware = (r0.get("firmware") or "").strip()
-    operating_system = (r0.get("operating_system") or "").strip()
-    fio_version = (r0.get("fio_version") or "").strip()
-
-    sections: Dict[Tuple[str, str], List[Dict[str, str]]] = {}
-    for r in page_rows:
-        sk = (r.get("section_key") or "").strip()
-        st = (r.get("section_title") or "").strip()
-        if not sk:
-            continue
-        sections.setdefault((sk, st), []).append(r)
-
-    section_items = sorted(sections.items(), key=lambda kv: (kv[0][0], kv[0][1]))
-
     lines: List[str] = []
     lines.append("---")
     lines.append(f'title: "{title}"')
     lines.append(f'description: "{description}"')
-    lines.append(f'category: "{category}"')
+    lines.append(f'category: "{product.category}"')
     lines.append(f'brand: "{brand}"')
     lines.append(f'model: "{model}"')
-    lines.append(f'brand_slug: "{brand_slug}"')
-    lines.append(f'model_slug: "{model_slug}"')
+    lines.append(f'brand_slug: "{product.brand_slug}"')
+    lines.append(f'model_slug: "{product.model_slug}"')
     lines.append(f'capacity_label: "{cap_label}"')
-    lines.append(f'capacity_slug: "{cap_slug}"')
+    lines.append(f'capacity_slug: "{product.capacity_slug}"')
+    lines.extend(extra)
     lines.append("---")
     lines.append("")
+    return lines
+
+
+def _meta_items(product: Product) -> List[Tuple[str, str]]:
+    """(data_meta_* key, value) rows of the test unit table; empty fields are left out."""
+    items = [("ssd_model", f"{product.brand} {product.model}")]
+    for key in ("capacity_gib", "serial_number", "firmware", "operating_system", "fio_version"):
+        value = getattr(product, key)
+        if value:
+            items.append((key, value))
+    return items
+
+
+def _section_items(product: Product) -> List[Tuple[str, List[Measurement]]]:
+    """Measurements grouped into tables by section, sorted by section key (then title)."""
+    sections: Dict[Tuple[str, str], List[Measurement]] = {}
+    for m in product.measurements:
+        sections.setdefault((m.section_key, m.section_title), []).append(m)
+    return [(key, rows) for (key, _title), rows in sorted(sections.items(), key=lambda kv: kv[0])]
+
+
+def build_md(product: Product) -> str:
+    lines = _front_matter(product)
     lines.append("{{< rawhtml >}}")
     lines.append("")
 
     lines.append('<table class="meta-table"><tbody>')
-    lines.append(f'<tr><th data-meta="ssd_model"></th><td>{html_escape(brand)} {html_escape(model)}</td></tr>')
-    if capacity_gib:
-        lines.append(f'<tr><th data-meta="capacity_gib"></th><td>{html_escape(capacity_gib)}</td></tr>')
-    if serial_number:
-        lines.append(f'<tr><th data-meta="serial_number"></th><td>{html_escape(serial_number)}</td></tr>')
-    if firmware:
-        lines.append(f'<tr><th data-meta="firmware"></th><td>{html_escape(firmware)}</td></tr>')
-    if operating_system:
-        lines.append(f'<tr><th data-meta="operating_system"></th><td>{html_escape(operating_system)}</td></tr>')
-    if fio_version:
-        lines.append(f'<tr><th data-meta="fio_version"></th><td>{html_escape(fio_version)}</td></tr>')
+    for key, value in _meta_items(product):
+        lines.append(f'<tr><th data-meta="{key}"></th><td>{html_escape(value)}</td></tr>')
     lines.append("</tbody></table>")
     lines.append("")
 
-    for (section_key, _section_title), rows in section_items:
+    for section_key, rows in _section_items(product):
         lines.append(f'<table class="data-table" data-test="{html_escape(section_key)}">')
         lines.append("<thead><tr>")
         lines.append('<th data-col="metric"></th>')
@@ -369,13 +405,10 @@ def build_md(page_rows: List[Dict[str, str]]) -> str:
         lines.append('<th data-col="attempt1"></th><th data-col="attempt2"></th><th data-col="attempt3"></th>')
         lines.append("</tr></thead><tbody>")
 
-        for r in rows:
-            metric_key = (r.get("metric_key") or "").strip()
-            avg_median = (r.get("avg_median") or "").strip()
-
-            a1 = (r.get("attempt1_value") or "").strip()
-            a2 = (r.get("attempt2_value") or "").strip()
-            a3 = (r.get("attempt3_value") or "").strip()
+        for m in rows:
+            metric_key = m.metric_key
+            avg_median = m.avg_median
+            a1, a2, a3 = m.attempts
 
             lines.append("<tr>")
             lines.append(f'<td data-metric="{html_escape(metric_key)}"></td>')
@@ -391,49 +424,85 @@ def build_md(page_rows: List[Dict[str, str]]) -> str:
     return "\n".join(lines)
 
 
-def write_index_md(path: Path, title: str) -> None:
-    atomic_write_text(
-        path,
-        "\n".join([
-            "---",
-            f'title: "{title}"',
-            "---",
-            "",
-        ])
-    )
+# -------------------------
+# Data-file output (--data-files): measurements under data/, front-matter stubs under content/
+# -------------------------
 
+def measurements_ref(product: Product) -> str:
+    """Key path of a product's file under data/measurements, as stored in the stub's `measurements` param."""
+    return f"{product.lang}/{product.path_key}"
 
-def write_category_index_md(path: Path, title: str, title_key: str) -> None:
-    atomic_write_text(
-        path,
-        "\n".join([
-            "---",
-            f'title: "{title}"',
-            f'titleKey: "{title_key}"',
-            "---",
-            "",
-        ])
-    )
 
+def build_measurements_json(product: Product) -> str:
+    """
+    What build_md puts into the rawhtml tables, as data for layouts/data/single.html:
+      {"meta": [[meta_key, value], ...], "sections": [{"key": section_key, "rows": [[metric_key, avg_median, a1, a2, a3], ...]}]}
+    Lists rather than objects, because Hugo ranges over maps in key order.
+    """
+    data = {
+        "meta": [list(item) for item in _meta_items(product)],
+        "sections": [
+            {"key": key, "rows": [[m.metric_key, m.avg_median, *m.attempts] for m in rows]}
+            for key, rows in _section_items(product)
+        ],
+    }
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n"
 
-def write_model_index_md(path: Path, title: str, breadcrumb_title: str) -> None:
-    atomic_write_text(
-        path,
-        "\n".join([
-            "---",
-            f'title: "{title}"',
-            f'breadcrumbTitle: "{breadcrumb_title}"',
-            "---",
-            "",
-        ])
-    )
+
+def remove_stale_measurements(lang: str, written: Set[Path], only: Optional[Set[str]] = None) -> None:
+    """
+    Delete data/measurements/<lang> files not written in this run (all of them, or with `only` just
+    those product paths): Hugo loads every data file, so removed products would stay in site.Data.
+    """
+    lang_dir = MEASUREMENTS_DATA_DIR / lang
+    if only is None:
+        candidates = list(lang_dir.rglob("*.json"))
+    else:
+        candidates = [lang_dir / f"{path}.json" for path in only]
+    for f in candidates:
+        if f not in written and f.exists():
+            f.unlink()
+            print(f"Removed stale measurements: {f}")
+
+
+def build_stub_md(product: Product) -> str:
+    return "\n".join(_front_matter(product, f'measurements: "{measurements_ref(product)}"'))
+
+
+def write_index_md(path: Path, title: str) -> bool:
+    return atomic_write_text(path, RENDER_CACHE.get(("index", title), lambda: "\n".join([
+        "---",
+        f'title: "{title}"',
+        "---",
+        "",
+    ])))
+
+
+def write_category_index_md(path: Path, title: str, title_key: str) -> bool:
+    return atomic_write_text(path, RENDER_CACHE.get(("category_index", title, title_key), lambda: "\n".join([
+        "---",
+        f'title: "{title}"',
+        f'titleKey: "{title_key}"',
+        "---",
+        "",
+    ])))
+
+
+def write_model_index_md(path: Path, title: str, breadcrumb_title: str) -> bool:
+    return atomic_write_text(path, RENDER_CACHE.get(("model_index", title, breadcrumb_title), lambda: "\n".join([
+        "---",
+        f'title: "{title}"',
+        f'breadcrumbTitle: "{breadcrumb_title}"',
+        "---",
+        "",
+    ])))
 
 
 # -------------------------
 # Data section indexes (for breadcrumbs + i18n)
 # -------------------------
 
-def write_data_root_index_md(path: Path, lang: str) -> None:
+def write_data_root_index_md(path: Path, lang: str) -> bool:
     """Create content/<lang>/data/_index.md.
 
     This makes breadcrumbs stable and allows i18n via titleKey.
@@ -445,7 +514,7 @@ def write_data_root_index_md(path: Path, lang: str) -> None:
     else:
         fallback_title = "Data"
     title_key = "section.data"
-    atomic_write_text(
+    return atomic_write_text(
         path,
         "\n".join([
             "---",
@@ -457,8 +526,13 @@ def write_data_root_index_md(path: Path, lang: str) -> None:
     )
 
 
-def generate_data_pages(rows: List[Dict[str, str]], lang: str) -> None:
-    pages: Dict[Tuple[str, str, str, str, str], List[Dict[str, str]]] = {}
+def generate_data_pages(products: List[Product], lang: str, only: Optional[Set[str]] = None,
+                        data_files: bool = False) -> None:
+    """
+    All data pages and section indexes of one language; with `only`, leaf pages just for those product paths.
+    With data_files, leaf pages are front-matter stubs and the measurements go to data/measurements.
+    """
+    pages: Dict[Tuple[str, str, str, str, str], Product] = {}
 
     categories_seen: Dict[str, str] = {}  # category_slug -> fallback_title
 
@@ -466,93 +540,179 @@ def generate_data_pages(rows: List[Dict[str, str]], lang: str) -> None:
     # model_indexes stores (title, breadcrumbTitle)
     model_indexes: Dict[Tuple[str, str, str, str], Tuple[str, str]] = {}
 
-    for r in rows:
-        category = (r.get("category") or "").strip()
-        brand_slug = (r.get("brand_slug") or "").strip()
-        model_slug = (r.get("model_slug") or "").strip()
-        capacity_slug = (r.get("capacity_slug") or "").strip()
-
-        if not (category and brand_slug and model_slug and capacity_slug):
-            continue
+    for p in products:
+        category = p.category
+        brand_slug = p.brand_slug
+        model_slug = p.model_slug
 
-        # Prefer explicit category title from sheet if provided
-        cat_title = (r.get("category_title") or r.get("category_name") or "").strip()
-        categories_seen.setdefault(category, cat_title or humanize_slug(category))
-
-        brand = (r.get("brand") or "").strip()
-        model = (r.get("model") or "").strip()
+        categories_seen.setdefault(category, p.category_title or humanize_slug(category))
 
         brand_key = (lang, category, brand_slug)
-        brand_indexes.setdefault(brand_key, brand or brand_slug)
+        brand_indexes.setdefault(brand_key, p.brand or brand_slug)
 
         model_key = (lang, category, brand_slug, model_slug)
         # title for listing = "Samsung T7", breadcrumbTitle = "T7"
         if model_key not in model_indexes:
-            model_indexes[model_key] = (f"{brand} {model}".strip(), model)
+            model_indexes[model_key] = (f"{p.brand} {p.model}".strip(), p.model)
 
-        key = (lang, category, brand_slug, model_slug, capacity_slug)
-        pages.setdefault(key, []).append(r)
+        pages[(lang, category, brand_slug, model_slug, p.capacity_slug)] = p
 
     # leaf pages
-    for (_, category, brand_slug, model_slug, capacity_slug), page_rows in sorted(pages.items()):
+    data_written: Set[Path] = set()
+    for (_, category, brand_slug, model_slug, capacity_slug), product in sorted(pages.items(), key=lambda kv: kv[0]):
+        if only is not None and product.path_key not in only:
+            continue
         out_dir = OUT_ROOT / lang / "data" / category / brand_slug / model_slug / capacity_slug
-        out_dir.mkdir(parents=True, exist_ok=True)
         out_file = out_dir / "index.md"
-        atomic_write_text(out_file, build_md(page_rows))
-        print(f"Wrote: {out_file}")
+        if data_files:
+            # DE/FR fallback pages are EN products: their stubs point at the EN file written in the EN pass
+            if product.lang == lang:
+                data_file = MEASUREMENTS_DATA_DIR / f"{measurements_ref(product)}.json"
+                if atomic_write_text(data_file, build_measurements_json(product)):
+                    print(f"Wrote: {data_file}")
+                data_written.add(data_file)
+            body = RENDER_CACHE.get(("stub", product.lang, product.content_key()), lambda: build_stub_md(product))
+        else:
+            # Body depends only on the product content: DE/FR fallback pages reuse the EN render.
+            body = RENDER_CACHE.get(("data", product.content_key()), lambda: build_md(product))
+        if atomic_write_text(out_file, body):
+            print(f"Wrote: {out_file}")
+
+    if data_files:
+        remove_stale_measurements(lang, data_written, only)
 
     # data root index
-    write_data_root_index_md(OUT_ROOT / lang / "data" / "_index.md", lang)
-    print(f"Index: {OUT_ROOT / lang / 'data' / '_index.md'}")
+    p = OUT_ROOT / lang / "data" / "_index.md"
+    if write_data_root_index_md(p, lang):
+        print(f"Index: {p}")
 
     # category index (_index.md) with titleKey (i18n)
     for category, fallback_title in sorted(categories_seen.items()):
         p = OUT_ROOT / lang / "data" / category / "_index.md"
         title_key = f"category.{category}"
-        write_category_index_md(p, fallback_title, title_key)
-        print(f"Index: {p}")
+        if write_category_index_md(p, fallback_title, title_key):
+            print(f"Index: {p}")
 
     # brand index (no breadcrumbTitle / titleKey)
     for (_, category, brand_slug), title in sorted(brand_indexes.items()):
         p = OUT_ROOT / lang / "data" / category / brand_slug / "_index.md"
-        write_index_md(p, title)
-        print(f"Index: {p}")
+        if write_index_md(p, title):
+            print(f"Index: {p}")
 
     # model index (with breadcrumbTitle)
     for (_, category, brand_slug, model_slug), (title, bc) in sorted(model_indexes.items()):
         p = OUT_ROOT / lang / "data" / category / brand_slug / model_slug / "_index.md"
-        write_model_index_md(p, title, bc)
-        print(f"Index: {p}")
+        if write_model_index_md(p, title, bc):
+            print(f"Index: {p}")
 
 
-def main() -> int:
-    rows_all = read_csv(CSV_URL)
-    rows_all = [r for r in rows_all if truthy(r.get("published", ""))]
-
-    by_lang = split_rows_by_lang(rows_all, default_lang="en")
-    rows_en = by_lang.get("en", [])
-
-    calc_source = rows_en if rows_en else rows_all
-    write_calculator_json(build_calculator_json(calc_source))
-
-    write_calculators_section_index_pages()
-    write_calc_category_index_pages()
-    write_calculator_pages()
-
-    for lang in TARGET_LANGS:
-        rows_lang = by_lang.get(lang, [])
-        if not rows_lang and lang != "en" and FALLBACK_TO_EN_IF_MISSING and rows_en:
+def build(wh: Warehouse, changed: Optional[Set[str]] = None, data_files: bool = False) -> None:
+    """
+    Calculator data and data pages from the warehouse. With `changed` (product paths from
+    Warehouse.sync), only those pages and the calculator shards of their categories are rebuilt.
+    data_files selects the page output (see generate_data_pages).
+    """
+    # Only the changed products are loaded for their pages; the calculator needs their whole categories
+    with METRICS.stage("load"):
+        store = MeasurementStore.from_rows(wh.rows(paths=changed), default_lang="en")
+    METRICS.count("products", len(store.products))
+    if changed is not None:
+        METRICS.count("products_changed", len(changed))
+        print(f"[i] {len(changed)} product(s) changed since the last sync.")
+    langs = wh.langs()
+    products_en = store.products_for("en")
+
+    with METRICS.stage("calculator"):
+        if changed is None:
+            write_calculator_json(build_calculator_json(products_en if "en" in langs else store.all_products()))
+        else:
+            categories = {path.split("/", 1)[0] for path in changed}
+            calc_store = MeasurementStore.from_rows(
+                wh.rows(categories=categories, lang="en" if "en" in langs else None), default_lang="en")
+            shards = build_calculator_json(calc_store.all_products())
+            # A category whose last product was removed gets an empty shard
+            for category in categories - shards.keys():
+                shards[category] = pack_calculator_shard(category, [])
+            write_calculator_json(shards, partial=True)
+
+        write_calculators_section_index_pages()
+        write_calc_category_index_pages()
+        write_calculator_pages()
+
+    if not data_files and changed is None and MEASUREMENTS_DATA_DIR.exists():
+        # Hugo loads every data file at startup, referenced or not
+        shutil.rmtree(MEASUREMENTS_DATA_DIR)
+        print(f"[i] Removed {MEASUREMENTS_DATA_DIR} (pages carry their tables again).")
+
+    page_langs = TARGET_LANGS
+    if changed is not None and not store.products:
+        # Every changed product was removed from the sheet: only their data files go
+        if data_files:
+            for lang in TARGET_LANGS:
+                remove_stale_measurements(lang, set(), changed)
+        print("[i] Changed products were all removed from the sheet — no pages to regenerate.")
+        page_langs = ()
+
+    for lang in page_langs:
+        products_lang = store.products_for(lang)
+        if lang not in langs and lang != "en" and FALLBACK_TO_EN_IF_MISSING and products_en:
             print(f"[i] No '{lang}' rows in sheet → generating '{lang}' from EN rows (fallback).")
-            rows_lang = rows_en
+            products_lang = products_en
 
-        if not rows_lang:
+        if not products_lang:
+            if data_files and changed:
+                # None of the changed products is left in this language: drop their data files
+                remove_stale_measurements(lang, set(), changed)
             print(f"[i] No rows for language '{lang}' — skipping.")
             continue
 
-        generate_data_pages(rows_lang, lang=lang)
+        with METRICS.stage(f"pages ({lang})"):
+            generate_data_pages(products_lang, lang=lang, only=changed, data_files=data_files)
 
+    METRICS.count("pages_rendered", RENDER_CACHE.renders)
+    METRICS.count("pages_shared", RENDER_CACHE.shared)
+    print(f"Files: {WRITE_STATS.summary()}; pages: {RENDER_CACHE.summary()}")
+
+
+def generate(csv_path: Path, digest: str, force: bool = False, data_files: bool = False) -> int:
+    """
+    Sync a fetched sheet (csv_path with body hash `digest`) into the warehouse and rebuild what
+    changed (everything with force). The warehouse commits only after all outputs are written.
+    """
+    stamp = build_stamp(digest, "data-files" if data_files else "markdown")
+    if not force and is_up_to_date(SHEET_CACHE_NAME, stamp):
+        print("[i] Sheet unchanged since last build — nothing to do (use --force to regenerate).")
+        return 0
+
+    with Warehouse.open() as wh:
+        # Rows stream from the cached CSV straight into the warehouse
+        with METRICS.stage("parse"):
+            changed = wh.sync((r for r in read_csv(csv_path) if truthy(r.get("published", ""))), digest)
+        if wh.skipped_rows:
+            print(f"[i] {wh.skipped_rows} published row(s) without category/brand/model/capacity slug — ignored.")
+        # Switching the output mode rewrites every page
+        full = force or data_files != MEASUREMENTS_DATA_DIR.is_dir()
+        build(wh, None if full else changed, data_files)
+    mark_built(SHEET_CACHE_NAME, stamp)
     return 0
 
 
+def main() -> int:
+    # --data-files: measurements as Hugo data files plus front-matter stubs instead of rawhtml pages
+    data_files = "--data-files" in sys.argv
+    if "--from-db" in sys.argv:
+        # Rebuild everything from the last synced sheet, no network
+        with Warehouse.open() as wh:
+            build(wh, data_files=data_files)
+        return 0
+    try:
+        with METRICS.stage("fetch"):
+            csv_path, digest = fetch_sheet(CSV_URL, SHEET_CACHE_NAME, offline="--offline" in sys.argv)
+    except FileNotFoundError as e:  # --offline without a cached copy
+        print(f"[!] {e}")
+        return 1
+    return generate(csv_path, digest, force="--force" in sys.argv, data_files=data_files)
+
+
 if __name__ == "__main__":
-    raise SystemExit(main())
\ No newline at end of file
+    raise SystemExit(run_main("sync_gsheet_models", main))
@@ -6,16 +6,19 @@ Writes content/<lang>/reviews/<category>/<brand_slug>/<model_slug>/<capacity_slu
 Uses data/kit_images.json (from photo.py) for kitImages when not in sheet.
 """
 
-import csv
-import io
 import json
-import re
+import sys
 from pathlib import Path
 from typing import Dict, List, Optional
-from urllib.request import urlopen
+
+from sync_io import (
+    METRICS, WRITE_STATS, atomic_write_text, build_stamp, fetch_sheet, is_up_to_date, mark_built, read_csv,
+    run_main,
+)
 
 # bd_text spreadsheet (review sheet)
 CSV_URL = "https://docs.google.com/spreadsheets/d/e/2PACX-1vSLFEW2jV1SY7MJg4OS74MYzoyksW7AETNOc8wo1z2qHFM9nNA2Ta42hP7mvuccpjZs27MoI7TzoQxW/pub?gid=0&single=true&output=csv"
+SHEET_CACHE_NAME = "reviews"  # .tmp/gsheet/reviews.csv
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_DIR.parent
@@ -23,31 +26,6 @@ OUT_ROOT = PROJECT_ROOT / "content"
 KIT_MANIFEST_PATH = PROJECT_ROOT / "data" / "kit_images.json"
 
 
-def norm_header(h: str) -> str:
-    h = (h or "").strip()
-    h = h.replace(" ", "_")
-    h = re.sub(r"[^a-zA-Z0-9_]", "", h)
-    return h.lower()
-
-
-def read_csv(url: str) -> List[Dict[str, str]]:
-    sep = "&" if "?" in url else "?"
-    raw = urlopen(f"{url}{sep}ts={__import__('time').time_ns()}").read().decode("utf-8", errors="replace")
-    reader = csv.reader(io.StringIO(raw))
-    rows = list(reader)
-    if not rows:
-        return []
-
-    headers = [norm_header(h) for h in rows[0]]
-    out: List[Dict[str, str]] = []
-    for line in rows[1:]:
-        d: Dict[str, str] = {}
-        for i, h in enumerate(headers):
-            d[h] = (line[i] if i < len(line) else "").strip()
-        out.append(d)
-    return out
-
-
 def truthy(v: str) -> bool:
     return str(v).strip().lower() in ("true", "1", "yes")
 
@@ -59,13 +37,6 @@ def yaml_quote(s: str) -> str:
     return f'"{s}"'
 
 
-def atomic_write_text(path: Path, text: str, encoding: str = "utf-8") -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    tmp.write_text(text, encoding=encoding, newline="\n")
-    tmp.replace(path)
-
-
 def load_kit_manifest() -> Dict[str, List[str]]:
     """Load kit_images.json from photo.py output. Returns {} if missing."""
     if not KIT_MANIFEST_PATH.exists():
@@ -121,12 +92,10 @@ def build_review_md(row: Dict[str, str], kit_manifest: Optional[Dict[str, List[s
     return "\n".join(lines)
 
 
-def main() -> int:
-    rows = read_csv(CSV_URL)
-    kit_manifest = load_kit_manifest()
+def write_review_pages(csv_path: Path, kit_manifest: Dict[str, List[str]]) -> int:
+    """Stream the sheet and write one page per published review row. Returns the number of reviews."""
     count = 0
-
-    for r in rows:
+    for r in read_csv(csv_path):
         if not truthy(r.get("published", "")):
             continue
 
@@ -141,13 +110,40 @@ def main() -> int:
 
         out_dir = OUT_ROOT / lang / "reviews" / category / brand_slug / model_slug / cap_slug
         out_file = out_dir / "_index.md"
-        atomic_write_text(out_file, build_review_md(r, kit_manifest))
-        print(f"Review: {out_file}")
+        if atomic_write_text(out_file, build_review_md(r, kit_manifest)):
+            print(f"Review: {out_file}")
         count += 1
+    return count
 
-    print(f"Done. {count} review(s) written.")
+
+def generate(csv_path: Path, digest: str, force: bool = False) -> int:
+    """Build the review pages from a fetched sheet; call after photo.py has written the kit manifest."""
+    kit_manifest = load_kit_manifest()
+    # Review pages depend on the sheet and on photo.py's kit manifest.
+    stamp = build_stamp(digest, json.dumps(kit_manifest, sort_keys=True))
+    if not force and is_up_to_date(SHEET_CACHE_NAME, stamp):
+        print("[i] Sheet and kit manifest unchanged since last build — nothing to do (use --force to regenerate).")
+        return 0
+
+    # Parsing, rendering and writing interleave row by row, so they share one stage.
+    with METRICS.stage("pages"):
+        count = write_review_pages(csv_path, kit_manifest)
+    METRICS.count("reviews", count)
+
+    print(f"Done. {count} review(s) processed ({WRITE_STATS.summary()}).")
+    mark_built(SHEET_CACHE_NAME, stamp)
     return 0
 
 
+def main() -> int:
+    try:
+        with METRICS.stage("fetch"):
+            csv_path, digest = fetch_sheet(CSV_URL, SHEET_CACHE_NAME, offline="--offline" in sys.argv)
+    except FileNotFoundError as e:  # --offline without a cached copy
+        print(f"[!] {e}")
+        return 1
+    return generate(csv_path, digest, force="--force" in sys.argv)
+
+
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(run_main("sync_gsheet_reviews", main))
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared I/O helpers for the sync scripts (sync_gsheet_models.py, sync_gsheet_reviews.py, photo.py).
+
+Writes are content-addressed: a file is only replaced when its bytes actually change,
+so unchanged pages keep their mtime and Hugo / Pages deploys only see real changes.
+
+Sheet fetches are conditional: the last response is kept under .tmp/gsheet/ with its
+validators (ETag / Last-Modified, plus a body hash), so a cron run against an unchanged
+sheet costs one 304 (or one hash compare) and no regeneration. Bodies are streamed to
+disk in chunks and parsed row by row from there, so memory stays flat for big sheets.
+Fetches share HTTP_POOL (keep-alive connections per host), so sync_all.py can fetch
+both sheets concurrently without a fresh TLS handshake per request.
+
+Every run records stage timings and counters in METRICS; run_main() reports them with
+--profile (table on stdout) and --metrics-json PATH (machine-readable, for cron alerts).
+When sync_all.py runs the scripts side by side, each one runs inside chain(name): its
+stages and counters are reported as "<name>/<stage>" and WRITE_STATS.summary() counts
+only its own files.
+"""
+
+import contextvars
+import csv
+import gzip
+import hashlib
+import json
+import math
+import http.client
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SHEET_CACHE_DIR = PROJECT_ROOT / ".tmp" / "gsheet"
+FETCH_TIMEOUT = 60  # seconds
+FETCH_CHUNK = 1 << 16  # bytes
+
+
+# -------------------------
+# Chains (sync_all.py): per-script stats in a shared process
+# -------------------------
+
+_CHAIN: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("sync_chain", default=None)
+
+
+@contextmanager
+def chain(name: Optional[str]):
+    """Attribute METRICS and WRITE_STATS updates of this thread (and bind_chain'ed helpers) to `name`."""
+    token = _CHAIN.set(name)
+    try:
+        yield
+    finally:
+        _CHAIN.reset(token)
+
+
+def bind_chain(fn: Callable) -> Callable:
+    """fn running in the caller's chain, for worker threads and future callbacks (they start without one)."""
+    name = _CHAIN.get()
+    if name is None:
+        return fn
+
+    def run(*args, **kwargs):
+        with chain(name):
+            return fn(*args, **kwargs)
+    return run
+
+
+class WriteStats:
+    """Counters for files written vs. skipped (identical content already on disk), in total and per chain."""
+
+    def __init__(self) -> None:
+        self.written = 0
+        self.skipped = 0
+        self.chains: Dict[str, List[int]] = {}  # chain -> [written, skipped]
+        self._lock = threading.Lock()
+
+    def add(self, written: bool) -> None:
+        name = _CHAIN.get()
+        with self._lock:
+            if written:
+                self.written += 1
+            else:
+                self.skipped += 1
+            if name is not None:
+                self.chains.setdefault(name, [0, 0])[0 if written else 1] += 1
+
+    def summary(self) -> str:
+        """The current chain's files (all files outside sync_all)."""
+        name = _CHAIN.get()
+        written, skipped = (self.written, self.skipped) if name is None else self.chains.get(name, (0, 0))
+        return f"{written} written, {skipped} unchanged"
+
+
+WRITE_STATS = WriteStats()
+
+
+class RunMetrics:
+    """
+    Stage wall times, counters and latency samples for one run of a sync script.
+    Stages keep their first-seen order; repeated stages accumulate. Safe to share between
+    threads (sync_all.py runs the scripts concurrently; stage times are wall time, so they overlap).
+    Names recorded inside chain(name) get a "<name>/" prefix, so the scripts' stages stay apart.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _name(name: str) -> str:
+        prefix = _CHAIN.get()
+        return name if prefix is None else f"{prefix}/{name}"
+
+    @contextmanager
+    def stage(self, name: str):
+        name = self._name(name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    def count(self, name: str, n: float = 1) -> None:
+        name = self._name(name)
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def maximum(self, name: str, value: float) -> None:
+        """Keep the largest value seen for a counter (e.g. peak RSS over workers)."""
+        name = self._name(name)
+        with self._lock:
+            self.counters[name] = max(self.counters.get(name, value), value)
+
+    def sample(self, name: str, seconds: float) -> None:
+        name = self._name(name)
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def report(self, script: str, exit_code: int) -> Dict:
+        counters = dict(self.counters)
+        counters["files_written"] = WRITE_STATS.written
+        counters["files_unchanged"] = WRITE_STATS.skipped
+        for name, (written, skipped) in sorted(WRITE_STATS.chains.items()):
+            counters[f"{name}/files_written"] = written
+            counters[f"{name}/files_unchanged"] = skipped
+        return {
+            "script": script,
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "total_seconds": round(time.time() - self.started, 3),
+            "exit_code": exit_code,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {k: round(v, 4) for k, v in self.stages.items()},
+            "counters": {k: round(v, 4) if isinstance(v, float) else v for k, v in counters.items()},
+            "latency": {k: latency_summary(v) for k, v in self.samples.items()},
+        }
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """count, mean and nearest-rank p50/p90/p95/p99/max of latency samples (seconds)."""
+    xs = sorted(samples)
+    n = len(xs)
+
+    def pct(p: float) -> float:
+        return round(xs[max(0, math.ceil(p / 100 * n) - 1)], 4)
+
+    return {"count": n, "mean": round(sum(xs) / n, 4), "p50": pct(50), "p90": pct(90),
+            "p95": pct(95), "p99": pct(99), "max": round(xs[-1], 4)}
+
+
+METRICS = RunMetrics()
+
+
+def same_bytes_on_disk(path: Path, data: bytes) -> bool:
+    """True if path exists and already holds exactly `data` (size check first, then bytes)."""
+    try:
+        if path.stat().st_size != len(data):
+            return False
+        return path.read_bytes() == data
+    except OSError:
+        return False
+
+
+def _replace_bytes(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> bool:
+    """Write via tmp + rename, skipping the write if content is identical. Returns True if written."""
+    t0 = time.perf_counter()
+    try:
+        if same_bytes_on_disk(path, data):
+            WRITE_STATS.add(written=False)
+            return False
+        _replace_bytes(path, data)
+        WRITE_STATS.add(written=True)
+        METRICS.count("bytes_written", len(data))
+        return True
+    finally:
+        METRICS.count("disk_io_seconds", time.perf_counter() - t0)
+
+
+def atomic_write_text(path: Path, text: str, encoding: str = "utf-8") -> bool:
+    """Text variant of atomic_write_bytes (always LF line endings). Returns True if written."""
+    return atomic_write_bytes(path, text.encode(encoding))
+
+
+def write_precompressed(path: Path, data: bytes) -> bool:
+    """
+    Write `data` plus .gz (and .br when the brotli module is installed) siblings for static
+    hosts that serve precompressed files. gzip mtime is pinned so unchanged data stays byte-identical.
+    Returns True if the uncompressed file was written.
+    """
+    written = atomic_write_bytes(path, data)
+    atomic_write_bytes(path.with_name(path.name + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        atomic_write_bytes(path.with_name(path.name + ".br"), brotli.compress(data, quality=11))
+    return written
+
+
+def reset_peak_rss() -> None:
+    """Reset the kernel's peak-RSS counter (Linux: VmHWM) so the next reading covers only what follows."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak RSS of this process in MB (since reset_peak_rss on Linux), None if unknown."""
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:  # Windows
+        return None
+
+
+# -------------------------
+# Pooled HTTP connections
+# -------------------------
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections per host, shared between threads. A connection serves one
+    request at a time and goes back to the idle list once its body is read, so requests to the
+    same host (both sheets, and the googleusercontent.com host they redirect to) reuse it.
+    """
+
+    def __init__(self, timeout: float = FETCH_TIMEOUT, max_redirects: int = 5) -> None:
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme: str, host: str) -> http.client.HTTPConnection:
+        METRICS.count("http_connections_opened")
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, timeout=self.timeout)
+
+    def _acquire(self, scheme: str, host: str) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get((scheme, host))
+            if idle:
+                METRICS.count("http_connections_reused")
+                return idle.pop(), True
+        return self._connect(scheme, host), False
+
+    def _release(self, scheme: str, host: str, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        if resp.will_close:
+            conn.close()
+            return
+        with self._lock:
+            self._idle.setdefault((scheme, host), []).append(conn)
+
+    def _send(self, url: str, headers: Dict[str, str], method: str = "GET", body: Optional[bytes] = None):
+        parts = urlsplit(url)
+        target = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        conn, reused = self._acquire(parts.scheme, parts.netloc)
+        try:
+            conn.request(method, target, body=body, headers=headers)
+            return parts, conn, conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionError):
+            conn.close()
+            if not reused:
+                raise
+        # The server dropped the idle connection in the meantime: one retry on a fresh one.
+        conn = self._connect(parts.scheme, parts.netloc)
+        conn.request(method, target, body=body, headers=headers)
+        return parts, conn, conn.getresponse()
+
+    def request(self, method: str, url: str, headers: Dict[str, str], body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        """One request without redirects, body read in full: (status, response body)."""
+        parts, conn, resp = self._send(url, headers, method, body)
+        data = resp.read()
+        self._release(parts.scheme, parts.netloc, conn, resp)
+        return resp.status, data
+
+    @contextmanager
+    def get(self, url: str, headers: Dict[str, str]) -> Iterator[http.client.HTTPResponse]:
+        """
+        GET `url`, following redirects; yields the final 2xx or 304 response for streaming.
+        Other statuses raise urllib's HTTPError, like urlopen().
+        """
+        for _ in range(self.max_redirects + 1):
+            parts, conn, resp = self._send(url, headers)
+            location = resp.getheader("Location")
+            if resp.status in (301, 302, 303, 307, 308) and location:
+                resp.read()
+                self._release(parts.scheme, parts.netloc, conn, resp)
+                url = urljoin(url, location)
+                continue
+            if not (200 <= resp.status < 300 or resp.status == 304):
+                resp.read()
+                self._release(parts.scheme, parts.netloc, conn, resp)
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+            try:
+                yield resp
+            except BaseException:
+                conn.close()  # body not fully read: the connection cannot be reused
+                raise
+            resp.read()
+            self._release(parts.scheme, parts.netloc, conn, resp)
+            return
+        raise HTTPError(url, 310, "Too many redirects", None, None)
+
+
+HTTP_POOL = ConnectionPool()
+
+
+# -------------------------
+# Cached, conditional sheet fetch
+# -------------------------
+
+def _cache_paths(name: str):
+    return SHEET_CACHE_DIR / f"{name}.csv", SHEET_CACHE_DIR / f"{name}.meta.json"
+
+
+def _load_meta(meta_path: Path) -> Dict[str, str]:
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _save_meta(meta_path: Path, meta: Dict[str, str]) -> None:
+    _replace_bytes(meta_path, (json.dumps(meta, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))
+
+
+def fetch_sheet(url: str, name: str, offline: bool = False) -> Tuple[Path, str]:
+    """
+    Make .tmp/gsheet/<name>.csv hold the current published sheet CSV.
+    Returns (path of the cached body, sha256 of the body).
+
+    Sends If-None-Match / If-Modified-Since when validators are known; a 304 reuses the
+    cached body. With offline=True the network is not touched at all. Thread-safe for
+    different names (each sheet has its own cache files).
+    """
+    body_path, meta_path = _cache_paths(name)
+    meta = _load_meta(meta_path)
+
+    if offline:
+        if not body_path.exists():
+            raise FileNotFoundError(f"--offline: no cached copy of '{name}' sheet at {body_path}")
+        print(f"[i] Offline: using cached '{name}' sheet ({body_path})")
+        return body_path, meta.get("sha256") or _file_sha256(body_path)
+
+    # Cache-Control replaces the old ?ts= cache-buster: intermediaries must revalidate.
+    headers = {"Cache-Control": "no-cache"}
+    if body_path.exists() and meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    part = body_path.with_suffix(".csv.part")
+    part.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    try:
+        with HTTP_POOL.get(url, headers) as resp:
+            if resp.status == 304:
+                print(f"[i] '{name}' sheet not modified (304)")
+                METRICS.count("sheets_not_modified")
+                return body_path, meta.get("sha256") or _file_sha256(body_path)
+            with part.open("wb") as f:
+                for chunk in iter(lambda: resp.read(FETCH_CHUNK), b""):
+                    h.update(chunk)
+                    f.write(chunk)
+                    METRICS.count("bytes_fetched", len(chunk))
+            etag = resp.getheader("ETag") or ""
+            last_modified = resp.getheader("Last-Modified") or ""
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+    digest = h.hexdigest()
+    part.replace(body_path)
+    meta.update({"url": url, "etag": etag, "last_modified": last_modified, "sha256": digest})
+    _save_meta(meta_path, meta)
+    return body_path, digest
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(FETCH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def norm_header(h: str) -> str:
+    h = (h or "").strip()
+    h = h.replace(" ", "_")
+    h = re.sub(r"[^a-zA-Z0-9_]", "", h)
+    return h.lower()
+
+
+def read_csv(path: Path) -> Iterator[Dict[str, str]]:
+    """
+    Yield sheet rows as {normalized_header: stripped value}, one at a time.
+    newline="" keeps quoted multi-line cells (review texts) intact.
+    """
+    rows = 0
+    try:
+        with path.open("r", encoding="utf-8", errors="replace", newline="") as f:
+            reader = csv.reader(f)
+            headers = [norm_header(h) for h in next(reader, [])]
+            for line in reader:
+                n = len(line)
+                rows += 1
+                yield {h: (line[i] if i < n else "").strip() for i, h in enumerate(headers)}
+    finally:
+        METRICS.count("rows_parsed", rows)
+
+
+def build_stamp(*parts: str) -> str:
+    """Fingerprint of everything a generation run depends on (sheet body, manifests, ...)."""
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def is_up_to_date(name: str, stamp: str) -> bool:
+    """True if the last successful build from sheet `name` used exactly these inputs."""
+    return _load_meta(_cache_paths(name)[1]).get("built") == stamp
+
+
+def mark_built(name: str, stamp: str) -> None:
+    """Record a successful build; call only after all outputs were written."""
+    meta_path = _cache_paths(name)[1]
+    meta = _load_meta(meta_path)
+    meta["built"] = stamp
+    _save_meta(meta_path, meta)
+
+
+# -------------------------
+# Run report (--profile / --metrics-json)
+# -------------------------
+
+def argv_value(flag: str) -> Optional[str]:
+    for i, arg in enumerate(sys.argv):
+        if arg == flag and i + 1 < len(sys.argv):
+            return sys.argv[i + 1]
+        if arg.startswith(flag + "="):
+            return arg.split("=", 1)[1]
+    return None
+
+
+def print_profile(report: Dict, file: Optional[TextIO] = None) -> None:
+    print(f"\n[profile] {report['script']}: {report['total_seconds']:.2f}s total, exit {report['exit_code']}", file=file)
+    for name, seconds in report["stages"].items():
+        print(f"  {name:<28} {seconds:>9.3f}s", file=file)
+    for name, value in report["counters"].items():
+        print(f"  {name:<28} {value:>10}", file=file)
+    for name, lat in report["latency"].items():
+        print(f"  {name:<28} n={lat['count']} p50={lat['p50'] * 1000:.0f}ms p90={lat['p90'] * 1000:.0f}ms "
+              f"p99={lat['p99'] * 1000:.0f}ms max={lat['max'] * 1000:.0f}ms", file=file)
+
+
+def run_main(script: str, main: Callable[[], Optional[int]], profile_file: Optional[TextIO] = None) -> int:
+    """
+    Run a sync script's main() and report METRICS afterwards (also on early exits and failures):
+    --profile prints a stage table (to profile_file, default stdout), --metrics-json PATH writes
+    the report as JSON.
+    """
+    exit_code = 1
+    try:
+        exit_code = main() or 0
+        return exit_code
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        raise
+    finally:
+        report = METRICS.report(script, exit_code)
+        if "--profile" in sys.argv:
+            print_profile(report, profile_file)
+        path = argv_value("--metrics-json")
+        if path:
+            _replace_bytes(Path(path), (json.dumps(report, indent=2) + "\n").encode("utf-8"))
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local SQLite copy of the published models sheet (.tmp/measurements.sqlite).
+
+sync_gsheet_models.py upserts every fetched sheet into it and gets back the products whose
+rows changed, so only their data pages and calculator categories are regenerated. Products
+are compared by a hash of their rows; changed metric values are kept in `history`, one row
+per change and run, with the firmware before and after (re-tests after a firmware update).
+
+Tables (keys as in the sheet):
+
+    products      (lang, category, brand_slug, model_slug, capacity_slug) + product meta, content_hash
+    measurements  (... , ord) + section_key, metric_key, section_title, avg_median, attempt1..3_value
+                  (every sheet row in order; a metric may repeat)
+    runs          id, started, sheet_sha256, changed
+    history       run, product key, section_key, metric_key, change (added / changed / removed),
+                  old/new avg_median, old/new attempts, old/new firmware
+
+Ad-hoc use, no network:
+
+    python scripts/warehouse.py history [category/brand/model/capacity]
+    python scripts/warehouse.py sql "SELECT brand, model, avg_median FROM measurements JOIN products USING (...)"
+    python scripts/sync_gsheet_models.py --from-db      (rebuild all pages from the database)
+"""
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from measurements import SHEET_COLUMNS
+from sync_io import PROJECT_ROOT
+
+DB_PATH = PROJECT_ROOT / ".tmp" / "measurements.sqlite"
+
+PRODUCT_KEY = ("lang", "category", "brand_slug", "model_slug", "capacity_slug")
+PRODUCT_META = ("category_title", "category_name", "brand", "model", "capacity_label", "capacity_gib",
+                "serial_number", "firmware", "operating_system", "fio_version")
+METRIC_KEY = ("section_key", "metric_key")
+METRIC_VALUES = ("section_title", "avg_median", "attempt1_value", "attempt2_value", "attempt3_value")
+# Sheet columns kept per row ("published" is implied: only published rows are stored), plus
+# category_name, the older name of category_title that Product still reads
+ROW_COLUMNS = tuple(c for c in SHEET_COLUMNS if c != "published") + ("category_name",)
+SCHEMA_VERSION = 2  # PRAGMA user_version; products/measurements are rebuilt from the next sheet on a mismatch
+
+_KEY_WHERE = " AND ".join(f"{c} = ?" for c in PRODUCT_KEY)
+_META_AT = [ROW_COLUMNS.index(c) for c in PRODUCT_META]
+_METRIC_AT = [ROW_COLUMNS.index(c) for c in PRODUCT_KEY + METRIC_KEY + METRIC_VALUES]
+_SECTION_AT = ROW_COLUMNS.index("section_key")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS products (
+    {", ".join(f"{c} TEXT NOT NULL" for c in PRODUCT_KEY)},
+    {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in PRODUCT_META)},
+    content_hash TEXT NOT NULL,
+    updated_run INTEGER,
+    PRIMARY KEY ({", ".join(PRODUCT_KEY)})
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS measurements (
+    {", ".join(f"{c} TEXT NOT NULL" for c in PRODUCT_KEY + METRIC_KEY)},
+    {", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in METRIC_VALUES)},
+    ord INTEGER NOT NULL,
+    PRIMARY KEY ({", ".join(PRODUCT_KEY)}, ord)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS measurements_metric ON measurements (section_key, metric_key);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT NOT NULL,
+    sheet_sha256 TEXT,
+    changed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS history (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    {", ".join(f"{c} TEXT NOT NULL" for c in PRODUCT_KEY + METRIC_KEY)},
+    change TEXT NOT NULL,
+    old_avg_median TEXT, new_avg_median TEXT,
+    old_attempts TEXT, new_attempts TEXT,
+    old_firmware TEXT, new_firmware TEXT
+);
+CREATE INDEX IF NOT EXISTS history_product ON history (category, brand_slug, model_slug, capacity_slug);
+"""
+
+ProductKey = Tuple[str, str, str, str, str]
+
+
+def product_path(key: ProductKey) -> str:
+    """category/brand/model/capacity (Product.path_key, same for every language)."""
+    return "/".join(key[1:])
+
+
+def _content_hash(rows: List[tuple]) -> str:
+    """sha256 over a product's rows in sheet order (unit/record separators cannot occur in cells)."""
+    return hashlib.sha256("\x1e".join("\x1f".join(r) for r in rows).encode("utf-8")).hexdigest()
+
+
+def _incoming_measurements(rows: List[tuple]) -> Dict[Tuple[str, str], Tuple[str, str]]:
+    out: Dict[Tuple[str, str], Tuple[str, str]] = {}
+    for r in rows:
+        row = dict(zip(ROW_COLUMNS, r))
+        if row["section_key"]:
+            out.setdefault((row["section_key"], row["metric_key"]),
+                           (row["avg_median"], " / ".join((row["attempt1_value"], row["attempt2_value"], row["attempt3_value"]))))
+    return out
+
+
+class Warehouse:
+    """
+    One connection, one transaction per run: open() begins it and the with-block commits on
+    success, so the database only moves forward together with the pages built from it.
+    """
+
+    def __init__(self, path: Path = DB_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path), isolation_level=None)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Older layout: drop the derived tables (history and runs stay); the next sync re-adds every product
+            self.db.executescript(f"DROP TABLE IF EXISTS measurements; DROP TABLE IF EXISTS products; "
+                                  f"PRAGMA user_version = {SCHEMA_VERSION};")
+        self.db.executescript(SCHEMA)
+        self.skipped_rows = 0  # rows without the four slugs in the last sync()
+
+    @classmethod
+    def open(cls, path: Optional[Path] = None) -> "Warehouse":
+        return cls(path or DB_PATH)
+
+    def __enter__(self) -> "Warehouse":
+        self.db.execute("BEGIN")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.db.close()
+
+    # -------------------------
+    # Sync from the sheet
+    # -------------------------
+
+    def sync(self, rows: Iterable[Dict[str, str]], sheet_sha256: Optional[str] = None) -> Set[str]:
+        """
+        Upsert published sheet rows; products missing from them are removed. Returns the
+        product paths (category/brand/model/capacity, any language) that were added, changed or removed.
+        """
+        db = self.db
+        key_at = [ROW_COLUMNS.index(c) for c in PRODUCT_KEY]
+        incoming: Dict[ProductKey, List[tuple]] = {}  # product -> its rows, in sheet order
+        self.skipped_rows = 0
+        for r in rows:
+            values = tuple((r.get(c) or "").strip() for c in ROW_COLUMNS)
+            values = (values[0].lower() or "en",) + values[1:]
+            key = tuple(values[i] for i in key_at)
+            if not all(key[1:]):
+                self.skipped_rows += 1
+                continue
+            incoming.setdefault(key, []).append(values)
+
+        known = {tuple(r[:5]): r[5] for r in db.execute(f"SELECT {', '.join(PRODUCT_KEY)}, content_hash FROM products")}
+        digests = {k: _content_hash(v) for k, v in incoming.items()}
+        changed = [k for k, d in digests.items() if known.get(k) != d]
+        removed = [k for k in known if k not in digests]
+
+        run = db.execute(
+            "INSERT INTO runs (started, sheet_sha256, changed) VALUES (?, ?, ?)",
+            (datetime.now(timezone.utc).isoformat(timespec="seconds"), sheet_sha256, len(changed) + len(removed)),
+        ).lastrowid
+        for key in changed:
+            self._replace_product(run, key, incoming[key], digests[key])
+        for key in removed:
+            self._record_history(run, key, {}, None)
+            db.execute(f"DELETE FROM measurements WHERE {_KEY_WHERE}", key)
+            db.execute(f"DELETE FROM products WHERE {_KEY_WHERE}", key)
+        return {product_path(k) for k in changed + removed}
+
+    def _measurements(self, key: ProductKey) -> Dict[Tuple[str, str], Tuple[str, str]]:
+        """(section_key, metric_key) -> (avg_median, attempts) of a stored product; first row per metric, as in history."""
+        out: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        for s, m, median, a1, a2, a3 in self.db.execute(
+                f"SELECT section_key, metric_key, avg_median, attempt1_value, attempt2_value, attempt3_value "
+                f"FROM measurements WHERE {_KEY_WHERE} ORDER BY ord", key):
+            out.setdefault((s, m), (median, " / ".join((a1, a2, a3))))
+        return out
+
+    def _firmware(self, key: ProductKey) -> Optional[str]:
+        row = self.db.execute(f"SELECT firmware FROM products WHERE {_KEY_WHERE}", key).fetchone()
+        return row[0] if row else None
+
+    def _record_history(self, run: int, key: ProductKey, new: Dict[Tuple[str, str], Tuple[str, str]],
+                        new_firmware: Optional[str]) -> None:
+        old = self._measurements(key)
+        if not old:
+            return  # a new product is not a change of anything
+        old_firmware = self._firmware(key)
+        out = []
+        for mk in sorted(old.keys() | new.keys()):
+            o, n = old.get(mk), new.get(mk)
+            if o == n:
+                continue
+            change = "added" if o is None else "removed" if n is None else "changed"
+            out.append((run, *key, *mk, change, o and o[0], n and n[0], o and o[1], n and n[1], old_firmware, new_firmware))
+        if out:
+            self.db.executemany(f"INSERT INTO history VALUES ({', '.join('?' * 15)})", out)
+
+    def _replace_product(self, run: int, key: ProductKey, rows: List[tuple], content_hash: str) -> None:
+        db = self.db
+        meta = [rows[0][i] for i in _META_AT]
+        self._record_history(run, key, _incoming_measurements(rows), meta[PRODUCT_META.index("firmware")])
+        db.execute(f"DELETE FROM measurements WHERE {_KEY_WHERE}", key)
+        # Every row in sheet order, repeated metrics included: pages render them all
+        db.executemany(
+            f"INSERT INTO measurements ({', '.join(PRODUCT_KEY + METRIC_KEY + METRIC_VALUES)}, ord) "
+            f"VALUES ({', '.join('?' * (len(_METRIC_AT) + 1))})",
+            [tuple(r[i] for i in _METRIC_AT) + (pos,) for pos, r in enumerate(rows) if r[_SECTION_AT]])
+        db.execute(
+            f"INSERT OR REPLACE INTO products ({', '.join(PRODUCT_KEY + PRODUCT_META)}, content_hash, updated_run) "
+            f"VALUES ({', '.join('?' * (len(PRODUCT_KEY) + len(PRODUCT_META) + 2))})",
+            (*key, *meta, content_hash, run))
+
+    # -------------------------
+    # Read back
+    # -------------------------
+
+    def langs(self) -> Set[str]:
+        return {r[0] for r in self.db.execute("SELECT DISTINCT lang FROM products")}
+
+    def rows(self, paths: Optional[Set[str]] = None, categories: Optional[Set[str]] = None,
+             lang: Optional[str] = None) -> Iterator[Dict[str, str]]:
+        """
+        Stored products as sheet rows (product meta on every row), for MeasurementStore.from_rows;
+        optionally only the given product paths, categories and/or language.
+        """
+        cols = PRODUCT_KEY + PRODUCT_META + METRIC_KEY + METRIC_VALUES
+        names = [f"p.{c}" for c in PRODUCT_KEY + PRODUCT_META] + [f"m.{c}" for c in METRIC_KEY + METRIC_VALUES]
+        where: List[str] = []
+        args: List[str] = []
+        if paths is not None:
+            where.append("p.category || '/' || p.brand_slug || '/' || p.model_slug || '/' || p.capacity_slug "
+                         "IN (SELECT value FROM json_each(?))")
+            args.append(json.dumps(sorted(paths)))
+        if categories is not None:
+            where.append("p.category IN (SELECT value FROM json_each(?))")
+            args.append(json.dumps(sorted(categories)))
+        if lang is not None:
+            where.append("p.lang = ?")
+            args.append(lang)
+        cur = self.db.execute(
+            f"SELECT {', '.join(names)} FROM products p LEFT JOIN measurements m USING ({', '.join(PRODUCT_KEY)}) "
+            + (f"WHERE {' AND '.join(where)} " if where else "")
+            + f"ORDER BY {', '.join(f'p.{c}' for c in PRODUCT_KEY)}, m.ord", args)
+        for values in cur:
+            row = {c: v or "" for c, v in zip(cols, values)}
+            row["published"] = "TRUE"
+            yield row
+
+    def history(self, path: Optional[str] = None) -> Iterator[tuple]:
+        """Recorded changes, newest run first; optionally of one category/brand/model/capacity."""
+        sql = ("SELECT r.started, h.lang, h.category || '/' || h.brand_slug || '/' || h.model_slug || '/' || h.capacity_slug, "
+               "h.section_key, h.metric_key, h.change, h.old_avg_median, h.new_avg_median, h.old_firmware, h.new_firmware "
+               "FROM history h JOIN runs r ON r.id = h.run")
+        args: tuple = ()
+        if path:
+            sql += " WHERE h.category = ? AND h.brand_slug = ? AND h.model_slug = ? AND h.capacity_slug = ?"
+            args = tuple(path.strip("/").split("/"))
+        return self.db.execute(sql + " ORDER BY h.run DESC, h.lang, h.section_key, h.metric_key", args)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Query the local measurement database (no network)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    h = sub.add_parser("history", help="changed measurements per sync run")
+    h.add_argument("product", nargs="?", help="category/brand/model/capacity")
+    q = sub.add_parser("sql", help="run a query and print the rows tab-separated")
+    q.add_argument("query")
+    args = ap.parse_args(argv)
+
+    if not DB_PATH.exists():
+        print(f"[!] {DB_PATH} not found — run sync_gsheet_models.py first.")
+        return 1
+    with Warehouse.open() as wh:
+        if args.cmd == "history":
+            for started, lang, path, section, metric, change, old, new, old_fw, new_fw in wh.history(args.product):
+                fw = f"  (firmware {old_fw} -> {new_fw})" if old_fw and new_fw and old_fw != new_fw else ""
+                print(f"{started}  {lang}  {path}  {section}/{metric}  {change}: {old or '—'} -> {new or '—'}{fw}")
+        else:
+            cur = wh.db.execute(args.query)
+            if cur.description:
+                print("\t".join(d[0] for d in cur.description))
+            for row in cur:
+                print("\t".join("" if v is None else str(v) for v in row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())